@@ -0,0 +1,95 @@
+import re
+import threading
+from html.parser import HTMLParser
+from typing import Dict, Any, Optional
+
+from cachetools import LRUCache
+
+# Upper bound on the body text sent to the model; keeps prefill cost bounded for long threads
+MAX_BODY_CHARS = 16000
+# Share of the budget kept from the start of the body when truncating; the rest comes from the end
+HEAD_RATIO = 0.75
+TRUNCATION_MARKER = "\n[...]\n"
+# Number of cleaned bodies kept in memory, enough for a few batches of recent messages
+BODY_CACHE_SIZE = 512
+
+_cleaned_bodies = LRUCache(maxsize=BODY_CACHE_SIZE)
+_cleaned_bodies_lock = threading.Lock()
+
+_SPACES_RE = re.compile(r"[^\S\n]+")
+_NEWLINES_RE = re.compile(r" ?\n\s*")
+
+
+class _TextExtractor(HTMLParser):
+    """Collects the visible text of an HTML document."""
+
+    _SKIP_TAGS = frozenset({"script", "style", "head", "title"})
+    _BLOCK_TAGS = frozenset({"br", "p", "div", "tr", "li", "h1", "h2", "h3", "h4", "h5", "h6", "table"})
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self._SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag in self._BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in self._SKIP_TAGS and self._skip_depth:
+            self._skip_depth -= 1
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self.parts.append(data)
+
+
+def html_to_text(html: str) -> str:
+    """Strip tags, scripts and styles from an HTML body."""
+    parser = _TextExtractor()
+    parser.feed(html)
+    parser.close()
+    return " ".join(parser.parts)
+
+
+def clean_body(plain: Optional[str], html: Optional[str], max_chars: int = MAX_BODY_CHARS) -> str:
+    """Turn a message body into compact plain text for a prompt.
+
+    Prefers the plain-text part and falls back to the text of the HTML part.
+    Whitespace runs are collapsed, and bodies longer than max_chars keep their
+    head and tail with a marker in between.
+    """
+    text = plain or (html_to_text(html) if html else "")
+    text = _NEWLINES_RE.sub("\n", _SPACES_RE.sub(" ", text)).strip()
+
+    if len(text) > max_chars:
+        head = int(max_chars * HEAD_RATIO)
+        tail = max_chars - head
+        text = f"{text[:head]}{TRUNCATION_MARKER}{text[-tail:]}"
+
+    return text
+
+
+def email_body(email_data: Dict[str, Any]) -> str:
+    """Return the cleaned body of a processed message.
+
+    Results are cached by message id, so agents sharing one message in a
+    batch clean it only once. The message dict itself is not modified.
+    """
+    plain, html = email_data.get("body_plain"), email_data.get("body_html")
+    message_id = email_data.get("id")
+    if message_id is None:
+        return clean_body(plain, html)
+
+    # The part lengths tell apart copies of one id fetched in different formats, without
+    # keeping the raw bodies alive in the key or hashing them on every lookup
+    key = (message_id, len(plain or ""), len(html or ""))
+    with _cleaned_bodies_lock:
+        body = _cleaned_bodies.get(key)
+    if body is None:
+        body = clean_body(plain, html)
+        with _cleaned_bodies_lock:
+            _cleaned_bodies[key] = body
+    return body
@@ -1,4 +1,8 @@
-from typing import List, Dict, Any
+import asyncio
+import logging
+from datetime import date
+from functools import partial
+from typing import List, Dict, Any, Iterable, Optional, Tuple
 from sqlalchemy.orm import Session
 
 from app.services.gmail_client import GmailClient
@@ -6,7 +10,14 @@ from app.agents.summarizer import SummarizerAgent
 from app.agents.finance_agent import FinanceAgent
 from app.agents.todo_agent import TodoAgent
 from app.agents.reminder_agent import ReminderAgent
-from app.db.repositories import EmailRepository
+from app.agents.unified_agent import UnifiedAgent
+from app.agents._body_cleaner import email_body
+from app.db.repositories import EmailRepository, AgentResultRepository
+
+logger = logging.getLogger(__name__)
+
+# Emails whose cleaned body is shorter than this go to the lite unified agent when one is set
+SHORT_BODY_CHARS = 500
 
 
 class BatchProcessorAgent:
@@ -20,14 +31,22 @@ class BatchProcessorAgent:
         finance_agent: FinanceAgent,
         todo_agent: TodoAgent,
         reminder_agent: ReminderAgent,
+        unified_agent: Optional[UnifiedAgent] = None,
+        lite_unified_agent: Optional[UnifiedAgent] = None,
+        max_concurrency: int = 16,
     ):
         self.gmail_client = gmail_client
         self.summarizer = summarizer
         self.finance_agent = finance_agent
         self.todo_agent = todo_agent
         self.reminder_agent = reminder_agent
+        self.unified_agent = unified_agent
+        # Smaller model for short emails, where it matches the full model at lower latency
+        self.lite_unified_agent = lite_unified_agent
+        # Upper bound on Gemini calls in flight at once, to stay within the API's rate limits
+        self.max_concurrency = max_concurrency
 
-    def process_recent_emails(
+    async def process_recent_emails(
         self,
         db: Session,
         max_emails: int = 20,
@@ -36,18 +55,237 @@ class BatchProcessorAgent:
         """
         Fetch recent emails, run them through all agents, and assemble a summary.
 
+        Agent results are cached per (message, agent) in the database, so emails
+        that were already processed are answered without Gmail or Gemini calls.
+        The remaining emails are fetched up front with batched Gmail requests and
+        shared by the agents. When a unified agent is configured, the emails are
+        packed several to a Gemini call (see run_batched); otherwise each goes
+        through the four single-purpose agents. Gemini calls are awaited
+        concurrently on the event loop, at most max_concurrency at a time, while
+        the blocking Gmail and database calls run in worker threads.
+        A failing agent call is recorded in that email's "errors" instead of
+        failing the whole batch.
+
         Returns a dict with keys "overview" and "details".
         """
-        # TODO: implement retrieval of recent email IDs
-        # email_ids = EmailRepository.get_recent_email_ids(db, max_emails)
-        # TODO: load each email and run agents
-        # summaries = [self.summarizer.run(e_id) for e_id in email_ids]
-        # todos = [self.todo_agent.run(e_id) for e_id in email_ids]
-        # reminders = [self.reminder_agent.run(e_id) for e_id in email_ids]
-        # finances = [self.finance_agent.run(e_id) for e_id in email_ids]
-
-        # TODO: build overview + details structure
+        email_ids = await asyncio.to_thread(
+            self.gmail_client.list_message_ids, max_results=max_emails, query=query
+        )
+        # Date-aware prompts get today's date once per batch instead of once per email
+        today = date.today().isoformat()
+        if self.unified_agent is not None:
+            agents = [("unified", self.unified_agent.arun_with_body)]
+        else:
+            agents = [
+                ("summary", self.summarizer.arun_with_body),
+                ("todos", self.todo_agent.arun_with_body),
+                ("reminders", partial(self.reminder_agent.arun_with_body, today=today)),
+                ("finance", self.finance_agent.arun_with_body),
+            ]
+
+        details = {
+            message_id: {"message_id": message_id, "errors": {}}
+            for message_id in email_ids
+        }
+
+        cached = await asyncio.to_thread(
+            AgentResultRepository.get_results, db, email_ids, [agent_name for agent_name, _ in agents]
+        )
+        pending = []
+        for message_id in email_ids:
+            for agent_name, run in agents:
+                if (message_id, agent_name) in cached:
+                    self._store_result(details[message_id], agent_name, cached[message_id, agent_name])
+                else:
+                    pending.append((message_id, agent_name, run))
+
+        pending_ids = list(dict.fromkeys(message_id for message_id, _, _ in pending))
+        emails = await asyncio.to_thread(self.gmail_client.batch_get_messages, pending_ids) if pending_ids else {}
+        for message_id in pending_ids:
+            if message_id not in emails:
+                details[message_id]["errors"]["fetch"] = "Message could not be retrieved from Gmail"
+        pending = [task for task in pending if task[0] in emails]
+
+        new_results = []
+
+        def record(message_id: str, agent_name: str, result: Any) -> None:
+            self._store_result(details[message_id], agent_name, result)
+            # Parse failures come back as error dicts; only cache real results
+            if not (isinstance(result, dict) and "error" in result):
+                new_results.append({
+                    "message_id": message_id,
+                    "agent_name": agent_name,
+                    "result": result
+                })
+
+        def record_error(message_id: str, agent_name: str, error: Exception) -> None:
+            logger.warning(f"{agent_name} agent failed for message {message_id}: {str(error)}")
+            details[message_id][agent_name] = None
+            details[message_id]["errors"][agent_name] = str(error)
+
+        if self.unified_agent is not None:
+            results, errors = await self.run_batched(
+                [emails[message_id] for message_id, _, _ in pending], today=today
+            )
+            for message_id, result in results.items():
+                record(message_id, "unified", result)
+            for message_id, error in errors.items():
+                record_error(message_id, "unified", error)
+        elif pending:
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+
+            async def limited(run, message_id):
+                async with semaphore:
+                    return await run(message_id, emails[message_id])
+
+            outcomes = await asyncio.gather(
+                *(limited(run, message_id) for message_id, _, run in pending),
+                return_exceptions=True,
+            )
+            for (message_id, agent_name, _), outcome in zip(pending, outcomes):
+                if isinstance(outcome, Exception):
+                    record_error(message_id, agent_name, outcome)
+                else:
+                    record(message_id, agent_name, outcome)
+
+        await asyncio.to_thread(AgentResultRepository.save_results, db, new_results)
+
+        ordered_details = [details[message_id] for message_id in email_ids]
         return {
-            "overview": "",
-            "details": []
+            "overview": self._build_overview(ordered_details),
+            "details": ordered_details
         }
+
+    async def run_batched(
+        self,
+        emails: List[Dict[str, Any]],
+        batch_size: int = 8,
+        today: Optional[str] = None,
+    ) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, Exception]]:
+        """
+        Run the unified agent over fetched emails, several emails per Gemini call.
+
+        Emails are grouped into length buckets (see _length_buckets), so a
+        short notification is not packed into the same prompt as a long
+        thread. Groups made only of short emails (under SHORT_BODY_CHARS) go
+        to the lite unified agent when one is configured. A group whose
+        response is malformed falls back to one call per email.
+
+        Args:
+            emails: Processed messages, as returned by GmailClient.get_message
+            batch_size: Maximum number of emails packed into one Gemini call
+            today: Today's date as YYYY-MM-DD
+
+        Returns:
+            Tuple of (results, errors), both keyed by message ID
+        """
+        if self.unified_agent is None:
+            raise ValueError("run_batched requires a unified agent")
+
+        results, errors = {}, {}
+        if not emails:
+            return results, errors
+
+        today = today or date.today().isoformat()
+        batches = self._length_buckets(emails, batch_size)
+
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        outcomes = await asyncio.gather(
+            *(self._run_unified_batch(self._unified_agent_for(batch), batch, today, semaphore) for batch in batches)
+        )
+        for batch_outcomes in outcomes:
+            for message_id, outcome in batch_outcomes:
+                if isinstance(outcome, Exception):
+                    errors[message_id] = outcome
+                else:
+                    results[message_id] = outcome
+
+        return results, errors
+
+    def _unified_agent_for(self, batch: List[Dict[str, Any]]) -> UnifiedAgent:
+        """Pick the unified agent for a group of emails based on its longest body."""
+        if self.lite_unified_agent is not None and all(
+            len(email_body(email_data)) < SHORT_BODY_CHARS for email_data in batch
+        ):
+            return self.lite_unified_agent
+        return self.unified_agent
+
+    async def _run_unified_batch(
+        self,
+        agent: UnifiedAgent,
+        batch: List[Dict[str, Any]],
+        today: str,
+        semaphore: asyncio.Semaphore,
+    ) -> List[Tuple[str, Any]]:
+        """Process one group of emails, falling back to per-email calls if the batched call fails."""
+        if len(batch) > 1:
+            try:
+                async with semaphore:
+                    outputs = await agent.arun_many(batch, today=today)
+                return [(email_data["id"], output) for email_data, output in zip(batch, outputs)]
+            except Exception as e:
+                logger.warning(f"Batched extraction of {len(batch)} emails failed, retrying one by one: {str(e)}")
+
+        async def run_one(email_data):
+            async with semaphore:
+                return await agent.arun_with_body(email_data["id"], email_data, today=today)
+
+        outputs = await asyncio.gather(*(run_one(email_data) for email_data in batch), return_exceptions=True)
+        return [(email_data["id"], output) for email_data, output in zip(batch, outputs)]
+
+    @staticmethod
+    def _length_buckets(
+        emails: List[Dict[str, Any]],
+        batch_size: int,
+        max_ratio: float = 2.0,
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Split emails into groups of similar cleaned body length.
+
+        Emails are sorted by body length and a new group is started whenever
+        the next body is at least max_ratio times longer than the shortest in
+        the current group, or the group already holds batch_size emails.
+        """
+        buckets = []
+        current, shortest = [], 0
+        for email_data in sorted(emails, key=lambda email_data: len(email_body(email_data))):
+            length = max(len(email_body(email_data)), 1)
+            if current and (len(current) >= batch_size or length >= shortest * max_ratio):
+                buckets.append(current)
+                current = []
+            if not current:
+                shortest = length
+            current.append(email_data)
+        if current:
+            buckets.append(current)
+        return buckets
+
+    @staticmethod
+    def _store_result(item: Dict[str, Any], agent_name: str, result: Any) -> None:
+        """Place an agent result on an email's details entry."""
+        if agent_name == "unified":
+            item.update(result)
+        else:
+            item[agent_name] = result
+
+    @staticmethod
+    def _build_overview(details: Iterable[Dict[str, Any]]) -> str:
+        """Build a one-line overview of what was extracted across the batch."""
+        email_count = todo_count = reminder_count = finance_count = error_count = 0
+        for item in details:
+            email_count += 1
+            error_count += len(item["errors"])
+            todos = item.get("todos")
+            if isinstance(todos, dict):
+                todo_count += len(todos.get("todos") or [])
+            reminders = item.get("reminders")
+            if isinstance(reminders, dict):
+                reminder_count += len(reminders.get("reminders") or [])
+            finance = item.get("finance")
+            if isinstance(finance, dict) and "error" not in finance and finance.get("amount"):
+                finance_count += 1
+
+        return (
+            f"Processed {email_count} emails: {todo_count} todos, {reminder_count} reminders, "
+            f"{finance_count} with financial details, {error_count} agent errors."
+        )
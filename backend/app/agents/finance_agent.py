@@ -1,38 +1,77 @@
-import os
 import logging
-import json
 from typing import Dict, Any, Optional, List
 from pathlib import Path
 
 from agno.agent import Agent
 from agno.models.google import Gemini
-from dotenv import load_dotenv
+from google import genai
+from pydantic import ValidationError
+from app.core.config import get_settings
 from app.services.gmail_client import GmailClient
+from app.agents._body_cleaner import email_body
+from app.agents.schemas import FinanceExtraction
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-load_dotenv()
-
 class FinanceAgent:
     """Agent that extracts financial information from emails."""
+
+    _BASE_PROMPT = """Extract structured financial information from the following email.
+        Return a JSON object with the following fields (leave empty if not found):
+        - amount: monetary amount debited or credited
+        - account_numbers: account or card numbers (partially masked if present)
+        - transaction_purpose: purchase, refund, payment, bill, statement, etc.
+        - transaction_type: credit or debit
+        - due_date: any payment due date in YYYY-MM-DD format
+        - merchant: name of the merchant or company involved. clean it up for easier reading.
+        - category: spending category (e.g., dining, travel, utilities, etc.). extract from merchant.
+        
+        Return only valid, parseable JSON. Do not include notes or explanations outside the JSON.
+        """
     
-    def __init__(self, use_memory: bool = True):
+    def __init__(
+        self,
+        use_memory: bool = True,
+        gmail_client: Optional[GmailClient] = None,
+        gemini_client: Optional[genai.Client] = None,
+        model_id: str = "gemini-2.0-flash-lite",
+    ):
         self.use_memory = use_memory
-        self.gmail = GmailClient()
+        # Share clients across agents when given, so auth and connection pools are reused
+        self.gmail = gmail_client or GmailClient()
+        # Rules rarely change, so read them once rather than on every prompt
+        self._user_rules = self._get_user_rules() if use_memory else None
+        self._prompt_prefix = self._build_prompt_prefix()
         try:
-            api_key = os.getenv("GEMINI_API_KEY")
+            api_key = get_settings().gemini_api_key
             if not api_key:
                 raise ValueError("GEMINI_API_KEY environment variable not set")
                 
-            self.agent = Agent(
-                model=Gemini(id="gemini-2.0-flash", api_key=api_key),
-                markdown=True
-            )
+            # Built once and shared by every Agent this extractor creates
+            self._gemini_client = gemini_client or genai.Client(api_key=api_key)
+            self._model_id = model_id
         except Exception as e:
             logger.error(f"Failed to initialize Agno agent: {str(e)}")
             raise
 
+    def _new_agent(self) -> Agent:
+        """Build an agno Agent for one call around the shared Gemini client.
+
+        Agents keep per-run state on themselves, so concurrent calls on one
+        Agent get each other's responses. Each call gets its own instead.
+        """
+        # Constrain the response to the extraction schema so it is always parseable JSON
+        return Agent(
+            model=Gemini(
+                id=self._model_id,
+                client=self._gemini_client,
+                generation_config={
+                    "response_mime_type": "application/json",
+                    "response_schema": FinanceExtraction,
+                },
+            ),
+        )
+
     def run(self, message_id: str) -> Dict[str, Any]:
         """Run the finance agent on the given message.
         
@@ -47,90 +86,114 @@ class FinanceAgent:
         """
         try:
             # Fetch email from Gmail API
-            email_data = self.gmail.get_message(message_id)
-            body = email_data.get("body_plain") or email_data.get("body_html", "")
+            email_data = self.gmail.get_message(message_id) or {}
+        except Exception as e:
+            logger.error(f"Error fetching message {message_id}: {str(e)}")
+            raise
+        
+        return self.run_with_body(message_id, email_data)
+
+    def run_with_body(self, message_id: str, email_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Run the finance agent on an already fetched message.
+        
+        Args:
+            message_id: The ID of the message to extract financial information from
+            email_data: The processed message, as returned by GmailClient.get_message
             
-            if not body:
-                logger.warning(f"No email body found for message {message_id}")
-                raise ValueError("No email content found")
+        Returns:
+            Dictionary containing structured financial information
             
-            prompt = self.compose_prompt(body)
-            finance_data = self.call_agent(prompt)
+        Raises:
+            Exception: If there is an error processing the message
+        """
+        try:
+            prompt = self._prepare_prompt(message_id, email_data)
+            return self.call_agent(prompt)
+        except Exception as e:
+            logger.error(f"Error extracting finance data from message {message_id}: {str(e)}")
+            raise
+
+    async def arun_with_body(self, message_id: str, email_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Async variant of run_with_body, awaiting the Gemini call instead of blocking on it.
+        
+        Args:
+            message_id: The ID of the message to extract financial information from
+            email_data: The processed message, as returned by GmailClient.get_message
             
-            return finance_data
+        Returns:
+            Dictionary containing structured financial information
             
+        Raises:
+            Exception: If there is an error processing the message
+        """
+        try:
+            prompt = self._prepare_prompt(message_id, email_data)
+            return await self.acall_agent(prompt)
         except Exception as e:
             logger.error(f"Error extracting finance data from message {message_id}: {str(e)}")
             raise
 
+    def _prepare_prompt(self, message_id: str, email_data: Dict[str, Any]) -> str:
+        body = email_body(email_data)
+        
+        if not body:
+            logger.warning(f"No email body found for message {message_id}")
+            raise ValueError("No email content found")
+        
+        return self.compose_prompt(body)
+
     def _get_user_rules(self) -> Optional[str]:
         try:
             rules_path = Path(__file__).parent / "finance_rules.txt"
             if not rules_path.exists() or rules_path.stat().st_size == 0:
-                logger.info("Finance rules file is empty or doesn't exist")
+                logger.debug("Finance rules file is empty or doesn't exist")
                 return None
                 
             with open(rules_path, "r") as f:
                 rules = f.read().strip()
                 
             if not rules:
-                logger.info("Finance rules file is empty")
+                logger.debug("Finance rules file is empty")
                 return None
                 
-            logger.info("Finance rules loaded successfully")
+            logger.debug("Finance rules loaded successfully")
             return rules
         except Exception as e:
             logger.error(f"Error reading finance rules: {str(e)}")
             return None
     
+    def _build_prompt_prefix(self) -> str:
+        if self._user_rules:
+            return f"{self._BASE_PROMPT}\n\nUser Rules:\n{self._user_rules}"
+        return self._BASE_PROMPT
+
     def compose_prompt(self, email_text: str) -> str:
-        base_prompt = f"""Extract structured financial information from the following email.
-        Return a JSON object with the following fields (leave empty if not found):
-        - amount: monetary amount debited or credited
-        - account_numbers: account or card numbers (partially masked if present)
-        - transaction_purpose: purchase, refund, payment, bill, statement, etc.
-        - transaction_type: credit or debit
-        - due_date: any payment due date in YYYY-MM-DD format
-        - merchant: name of the merchant or company involved. clean it up for easier reading.
-        - category: spending category (e.g., dining, travel, utilities, etc.). extract from merchant.
-        
-        Return only valid, parseable JSON. Do not include notes or explanations outside the JSON.
-        """
-        
-        user_rules = None
-        if self.use_memory:
-            user_rules = self._get_user_rules()
-            
-        if user_rules:
-            prompt = f"{base_prompt}\n\nUser Rules:\n{user_rules}\n\nEmail Content:\n{email_text}"
-        else:
-            prompt = f"{base_prompt}\n\nEmail Content:\n{email_text}"
-        
-        return prompt
+        return f"{self._prompt_prefix}\n\nEmail Content:\n{email_text}"
 
     def call_agent(self, prompt: str) -> Dict[str, Any]:
         try:
-            response = self.agent.run(prompt)
-            # Parse the JSON response
-            try:
-                # Strip any markdown code block markers if present
-                content = response.content.strip()
-                if content.startswith("```json"):
-                    content = content[7:].strip()
-                if content.startswith("```"):
-                    content = content[3:].strip()
-                if content.endswith("```"):
-                    content = content[:-3].strip()
-                
-                finance_data = json.loads(content)
-                return finance_data
-            except json.JSONDecodeError as e:
-                logger.error(f"Failed to parse JSON response: {str(e)}")
-                # Return a structured error response
-                return {
-                    "error": "Failed to parse finance data",
-                    "raw_response": response.content
-                }
+            response = self._new_agent().run(prompt)
+            return self._parse_response(response.content)
+        except Exception as e:
+            logger.error(f"Error calling agent: {str(e)}")
+            raise
+
+    async def acall_agent(self, prompt: str) -> Dict[str, Any]:
+        try:
+            response = await self._new_agent().arun(prompt)
+            return self._parse_response(response.content)
         except Exception as e:
             logger.error(f"Error calling agent: {str(e)}")
             raise
+
+    def _parse_response(self, content: str) -> Dict[str, Any]:
+        # Parse and validate the JSON response
+        try:
+            return FinanceExtraction.model_validate_json(content).model_dump()
+        except ValidationError as e:
+            logger.error(f"Failed to parse JSON response: {str(e)}")
+            # Return a structured error response
+            return {
+                "error": "Failed to parse finance data",
+                "raw_response": content
+            }
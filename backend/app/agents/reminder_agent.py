@@ -1,39 +1,92 @@
-import os
 import logging
-import json
 from typing import Dict, Any, Optional, List
 from pathlib import Path
-from datetime import datetime
+from datetime import date
 
 from agno.agent import Agent
 from agno.models.google import Gemini
-from dotenv import load_dotenv
+from google import genai
+from pydantic import ValidationError
+from app.core.config import get_settings
 from app.services.gmail_client import GmailClient
+from app.agents._body_cleaner import email_body
+from app.agents.schemas import ReminderExtraction
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-load_dotenv()
-
 class ReminderAgent:
     """Agent that extracts reminders and scheduled events from emails."""
+
+    _BASE_PROMPT = """Extract all reminders, scheduled events, meetings, deadlines, and important dates from the following email.
+        Today's date is {today}.
+        
+        Return a JSON object with the following structure:
+        {{
+            "reminders": [
+                {{
+                    "title": "Brief description of the reminder",
+                    "date": "YYYY-MM-DD or null if not specified",
+                    "time": "HH:MM or null if not specified", 
+                    "location": "Location if applicable or null",
+                    "description": "Detailed description or context",
+                    "participants": ["List of people involved, if any"],
+                    "recurring": true/false,
+                    "recurrence_pattern": "daily/weekly/monthly/yearly/custom or null"
+                }}
+            ],
+            "has_time_sensitive_content": true/false
+        }}
+        
+        Only extract genuine reminders and scheduled events - not generic mentions of dates or times.
+        Return only valid, parseable JSON. Do not include notes or explanations outside the JSON.
+        If no reminders are found, return an empty array for "reminders" and set "has_time_sensitive_content" to false.
+        """
     
-    def __init__(self, use_memory: bool = True):
+    def __init__(
+        self,
+        use_memory: bool = True,
+        gmail_client: Optional[GmailClient] = None,
+        gemini_client: Optional[genai.Client] = None,
+        model_id: str = "gemini-2.0-flash",
+    ):
         self.use_memory = use_memory
-        self.gmail = GmailClient()
+        # Share clients across agents when given, so auth and connection pools are reused
+        self.gmail = gmail_client or GmailClient()
+        # Rules rarely change, so read them once rather than on every prompt
+        self._user_rules = self._get_user_rules() if use_memory else None
+        # Built lazily and rebuilt when the date in the prompt changes
+        self._prompt_prefix = None
+        self._prompt_prefix_date = None
         try:
-            api_key = os.getenv("GEMINI_API_KEY")
+            api_key = get_settings().gemini_api_key
             if not api_key:
                 raise ValueError("GEMINI_API_KEY environment variable not set")
                 
-            self.agent = Agent(
-                model=Gemini(id="gemini-2.0-flash", api_key=api_key),
-                markdown=True
-            )
+            # Built once and shared by every Agent this extractor creates
+            self._gemini_client = gemini_client or genai.Client(api_key=api_key)
+            self._model_id = model_id
         except Exception as e:
             logger.error(f"Failed to initialize Agno agent: {str(e)}")
             raise
 
+    def _new_agent(self) -> Agent:
+        """Build an agno Agent for one call around the shared Gemini client.
+
+        Agents keep per-run state on themselves, so concurrent calls on one
+        Agent get each other's responses. Each call gets its own instead.
+        """
+        # Constrain the response to the extraction schema so it is always parseable JSON
+        return Agent(
+            model=Gemini(
+                id=self._model_id,
+                client=self._gemini_client,
+                generation_config={
+                    "response_mime_type": "application/json",
+                    "response_schema": ReminderExtraction,
+                },
+            ),
+        )
+
     def run(self, message_id: str) -> Dict[str, Any]:
         """Run the reminder extraction agent on the given message.
         
@@ -48,107 +101,138 @@ class ReminderAgent:
         """
         try:
             # Fetch email from Gmail API
-            email_data = self.gmail.get_message(message_id)
-            body = email_data.get("body_plain") or email_data.get("body_html", "")
-            subject = email_data.get("subject", "")
-            date_str = email_data.get("date", "")
+            email_data = self.gmail.get_message(message_id) or {}
+        except Exception as e:
+            logger.error(f"Error fetching message {message_id}: {str(e)}")
+            raise
+        
+        return self.run_with_body(message_id, email_data)
+
+    def run_with_body(
+        self,
+        message_id: str,
+        email_data: Dict[str, Any],
+        today: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Run the reminder extraction agent on an already fetched message.
+        
+        Args:
+            message_id: The ID of the message to extract reminders from
+            email_data: The processed message, as returned by GmailClient.get_message
+            today: Today's date as YYYY-MM-DD; batch callers compute it once for all emails
             
-            if not body:
-                logger.warning(f"No email body found for message {message_id}")
-                raise ValueError("No email content found")
+        Returns:
+            Dictionary containing structured reminder data
             
-            prompt = self.compose_prompt(subject, body, date_str)
-            reminders_data = self.call_agent(prompt)
+        Raises:
+            Exception: If there is an error processing the message
+        """
+        try:
+            prompt = self._prepare_prompt(message_id, email_data, today)
+            return self.call_agent(prompt)
+        except Exception as e:
+            logger.error(f"Error extracting reminders from message {message_id}: {str(e)}")
+            raise
+
+    async def arun_with_body(
+        self,
+        message_id: str,
+        email_data: Dict[str, Any],
+        today: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Async variant of run_with_body, awaiting the Gemini call instead of blocking on it.
+        
+        Args:
+            message_id: The ID of the message to extract reminders from
+            email_data: The processed message, as returned by GmailClient.get_message
+            today: Today's date as YYYY-MM-DD; batch callers compute it once for all emails
             
-            return reminders_data
+        Returns:
+            Dictionary containing structured reminder data
             
+        Raises:
+            Exception: If there is an error processing the message
+        """
+        try:
+            prompt = self._prepare_prompt(message_id, email_data, today)
+            return await self.acall_agent(prompt)
         except Exception as e:
             logger.error(f"Error extracting reminders from message {message_id}: {str(e)}")
             raise
 
+    def _prepare_prompt(self, message_id: str, email_data: Dict[str, Any], today: Optional[str] = None) -> str:
+        body = email_body(email_data)
+        subject = email_data.get("subject", "")
+        date_str = email_data.get("date", "")
+        
+        if not body:
+            logger.warning(f"No email body found for message {message_id}")
+            raise ValueError("No email content found")
+        
+        return self.compose_prompt(subject, body, date_str, today)
+
     def _get_user_rules(self) -> Optional[str]:
         try:
             rules_path = Path(__file__).parent / "reminder_rules.txt"
             if not rules_path.exists() or rules_path.stat().st_size == 0:
-                logger.info("Reminder rules file is empty or doesn't exist")
+                logger.debug("Reminder rules file is empty or doesn't exist")
                 return None
                 
             with open(rules_path, "r") as f:
                 rules = f.read().strip()
                 
             if not rules:
-                logger.info("Reminder rules file is empty")
+                logger.debug("Reminder rules file is empty")
                 return None
                 
-            logger.info("Reminder rules loaded successfully")
+            logger.debug("Reminder rules loaded successfully")
             return rules
         except Exception as e:
             logger.error(f"Error reading reminder rules: {str(e)}")
             return None
     
-    def compose_prompt(self, subject: str, email_text: str, date_str: str) -> str:
-        today = datetime.now().strftime("%Y-%m-%d")
-        base_prompt = f"""Extract all reminders, scheduled events, meetings, deadlines, and important dates from the following email.
-        Today's date is {today}.
-        
-        Return a JSON object with the following structure:
-        {{
-            "reminders": [
-                {{
-                    "title": "Brief description of the reminder",
-                    "date": "YYYY-MM-DD or null if not specified",
-                    "time": "HH:MM or null if not specified", 
-                    "location": "Location if applicable or null",
-                    "description": "Detailed description or context",
-                    "participants": ["List of people involved, if any"],
-                    "recurring": true/false,
-                    "recurrence_pattern": "daily/weekly/monthly/yearly/custom or null"
-                }}
-            ],
-            "has_time_sensitive_content": true/false
-        }}
-        
-        Only extract genuine reminders and scheduled events - not generic mentions of dates or times.
-        Return only valid, parseable JSON. Do not include notes or explanations outside the JSON.
-        If no reminders are found, return an empty array for "reminders" and set "has_time_sensitive_content" to false.
-        """
-        
-        user_rules = None
-        if self.use_memory:
-            user_rules = self._get_user_rules()
-            
-        if user_rules:
-            prompt = f"{base_prompt}\n\nUser Rules:\n{user_rules}\n\nEmail Subject: {subject}\n\nEmail Date: {date_str}\n\nEmail Content:\n{email_text}"
-        else:
-            prompt = f"{base_prompt}\n\nEmail Subject: {subject}\n\nEmail Date: {date_str}\n\nEmail Content:\n{email_text}"
-        
-        return prompt
+    def _build_prompt_prefix(self, today: str) -> str:
+        base_prompt = self._BASE_PROMPT.format(today=today)
+        if self._user_rules:
+            return f"{base_prompt}\n\nUser Rules:\n{self._user_rules}"
+        return base_prompt
+
+    def _get_prompt_prefix(self, today: Optional[str] = None) -> str:
+        today = today or date.today().isoformat()
+        if today != self._prompt_prefix_date:
+            self._prompt_prefix = self._build_prompt_prefix(today)
+            self._prompt_prefix_date = today
+        return self._prompt_prefix
+
+    def compose_prompt(self, subject: str, email_text: str, date_str: str, today: Optional[str] = None) -> str:
+        return f"{self._get_prompt_prefix(today)}\n\nEmail Subject: {subject}\n\nEmail Date: {date_str}\n\nEmail Content:\n{email_text}"
 
     def call_agent(self, prompt: str) -> Dict[str, Any]:
         try:
-            response = self.agent.run(prompt)
-            # Parse the JSON response
-            try:
-                # Strip any markdown code block markers if present
-                content = response.content.strip()
-                if content.startswith("```json"):
-                    content = content[7:].strip()
-                if content.startswith("```"):
-                    content = content[3:].strip()
-                if content.endswith("```"):
-                    content = content[:-3].strip()
-                
-                reminders_data = json.loads(content)
-                return reminders_data
-            except json.JSONDecodeError as e:
-                logger.error(f"Failed to parse JSON response: {str(e)}")
-                # Return a structured error response
-                return {
-                    "error": "Failed to parse reminder data",
-                    "raw_response": response.content,
-                    "reminders": [],
-                    "has_time_sensitive_content": False
-                }
+            response = self._new_agent().run(prompt)
+            return self._parse_response(response.content)
         except Exception as e:
             logger.error(f"Error calling agent: {str(e)}")
             raise
+
+    async def acall_agent(self, prompt: str) -> Dict[str, Any]:
+        try:
+            response = await self._new_agent().arun(prompt)
+            return self._parse_response(response.content)
+        except Exception as e:
+            logger.error(f"Error calling agent: {str(e)}")
+            raise
+
+    def _parse_response(self, content: str) -> Dict[str, Any]:
+        # Parse and validate the JSON response
+        try:
+            return ReminderExtraction.model_validate_json(content).model_dump()
+        except ValidationError as e:
+            logger.error(f"Failed to parse JSON response: {str(e)}")
+            # Return a structured error response
+            return {
+                "error": "Failed to parse reminder data",
+                "raw_response": content,
+                "reminders": [],
+                "has_time_sensitive_content": False
+            }
@@ -0,0 +1,55 @@
+from typing import List, Optional
+
+from pydantic import BaseModel, Field
+
+
+class FinanceExtraction(BaseModel):
+    """Structured financial information extracted from an email."""
+    amount: Optional[str] = None
+    account_numbers: Optional[str] = None
+    transaction_purpose: Optional[str] = None
+    transaction_type: Optional[str] = None
+    due_date: Optional[str] = None
+    merchant: Optional[str] = None
+    category: Optional[str] = None
+
+
+class TodoItem(BaseModel):
+    """A single action item extracted from an email."""
+    task: str
+    priority: Optional[str] = None
+    due_date: Optional[str] = None
+    assignee: Optional[str] = None
+    context: Optional[str] = None
+
+
+class TodoExtraction(BaseModel):
+    """Todo items extracted from an email."""
+    todos: List[TodoItem] = Field(default_factory=list)
+    has_action_required: bool = False
+
+
+class ReminderItem(BaseModel):
+    """A single reminder or scheduled event extracted from an email."""
+    title: str
+    date: Optional[str] = None
+    time: Optional[str] = None
+    location: Optional[str] = None
+    description: Optional[str] = None
+    participants: List[str] = Field(default_factory=list)
+    recurring: bool = False
+    recurrence_pattern: Optional[str] = None
+
+
+class ReminderExtraction(BaseModel):
+    """Reminders and scheduled events extracted from an email."""
+    reminders: List[ReminderItem] = Field(default_factory=list)
+    has_time_sensitive_content: bool = False
+
+
+class UnifiedExtraction(BaseModel):
+    """Everything the batch pipeline extracts from an email in a single model call."""
+    summary: str
+    finance: FinanceExtraction
+    todos: TodoExtraction
+    reminders: ReminderExtraction
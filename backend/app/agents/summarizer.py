@@ -1,37 +1,80 @@
-import os
 import logging
-from typing import Dict, Any, Optional
+from typing import Dict, Any, AsyncIterator, Optional
 from pathlib import Path
 
 from agno.agent import Agent
 from agno.models.google import Gemini
-from dotenv import load_dotenv
+from google import genai
+from app.core.config import get_settings
 from app.services.gmail_client import GmailClient
+from app.agents._body_cleaner import email_body
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-load_dotenv()
-
 class SummarizerAgent:
     """Agent that summarizes emails."""
+
+    _BASE_PROMPT = """
+Analyze the following email thoroughly and extract all relevant information, regardless of the email's subject or type. Consider the context of professional, transactional, recruitment, and notification emails. Pay close attention to:
+
+Sender and Recipient: Identify who sent the email and to whom it is addressed.
+
+Subject Line: Note the main topic or purpose as indicated by the subject.
+
+Key Dates and Deadlines: Extract any dates, deadlines, or time-sensitive information.
+
+Action Items: List any required actions, tasks, or next steps for the recipient.
+
+Important Details: Capture critical information such as transaction IDs, reference numbers, application status, job titles, company names, links, or attachments.
+
+Main Content Summary: Briefly summarize the main message or purpose of the email in a few sentences.
+
+Tone and Urgency: Note the tone (e.g., formal, urgent, friendly) and indicate if immediate action is required.
+
+After extracting all relevant information, structure your response in a clear, concise format. If a custom instruction is provided (such as "summarise in 3 points"), ensure each point is information-rich, covering the most important aspects of the email. Each point should be self-contained and provide actionable or notable details, regardless of the email type.  Talk in first person, as if you're the user's assistant.
+
+Always ensure the summary is comprehensive and tailored to the specific content of the email, prioritizing clarity and relevance.
+
+Just output the summary, do not include any other text.
+        """
     
-    def __init__(self, use_memory: bool = True):
+    def __init__(
+        self,
+        use_memory: bool = True,
+        gmail_client: Optional[GmailClient] = None,
+        gemini_client: Optional[genai.Client] = None,
+        model_id: str = "gemini-2.0-flash",
+    ):
         self.use_memory = use_memory
-        self.gmail = GmailClient()
+        # Share clients across agents when given, so auth and connection pools are reused
+        self.gmail = gmail_client or GmailClient()
+        # Rules rarely change, so read them once rather than on every prompt
+        self._user_rules = self._get_user_rules() if use_memory else None
+        self._prompt_prefix = self._build_prompt_prefix()
         try:
-            api_key = os.getenv("GEMINI_API_KEY")
+            api_key = get_settings().gemini_api_key
             if not api_key:
                 raise ValueError("GEMINI_API_KEY environment variable not set")
                 
-            self.agent = Agent(
-                model=Gemini(id="gemini-2.0-flash", api_key=api_key),
-                markdown=True
-            )
+            # Built once and shared by every Agent this summarizer creates
+            self._gemini_client = gemini_client or genai.Client(api_key=api_key)
+            self._model_id = model_id
         except Exception as e:
             logger.error(f"Failed to initialize Agno agent: {str(e)}")
             raise
 
+    def _new_agent(self) -> Agent:
+        """Build an agno Agent for one call around the shared Gemini client.
+
+        Agents keep per-run state (run response, run ID, memory) on themselves,
+        so concurrent calls on one Agent get each other's responses. Each call
+        gets its own instead.
+        """
+        return Agent(
+            model=Gemini(id=self._model_id, client=self._gemini_client),
+            markdown=True
+        )
+
     def run(self, message_id: str) -> str:
         """Run the summarizer agent on the given message.
         
@@ -46,82 +89,113 @@ class SummarizerAgent:
         """
         try:
             # Fetch email from Gmail API
-            email_data = self.gmail.get_message(message_id)
-            body = email_data.get("body_plain") or email_data.get("body_html", "")
+            email_data = self.gmail.get_message(message_id) or {}
+        except Exception as e:
+            logger.error(f"Error fetching message {message_id}: {str(e)}")
+            raise
+        
+        return self.run_with_body(message_id, email_data)
+
+    def run_with_body(self, message_id: str, email_data: Dict[str, Any]) -> str:
+        """Run the summarizer agent on an already fetched message.
+        
+        Args:
+            message_id: The ID of the message to summarize
+            email_data: The processed message, as returned by GmailClient.get_message
             
-            if not body:
-                logger.warning(f"No email body found for message {message_id}")
-                raise ValueError("No email content found")
+        Returns:
+            The summary text
             
-            prompt = self.compose_prompt(body)
-            summary = self.call_agent(prompt)
+        Raises:
+            Exception: If there is an error summarizing the message
+        """
+        try:
+            prompt = self._prepare_prompt(message_id, email_data)
+            return self.call_agent(prompt)
+        except Exception as e:
+            logger.error(f"Error summarizing message {message_id}: {str(e)}")
+            raise
+
+    async def arun_with_body(self, message_id: str, email_data: Dict[str, Any]) -> str:
+        """Async variant of run_with_body, awaiting the Gemini call instead of blocking on it.
+        
+        Args:
+            message_id: The ID of the message to summarize
+            email_data: The processed message, as returned by GmailClient.get_message
             
-            return summary
+        Returns:
+            The summary text
             
+        Raises:
+            Exception: If there is an error summarizing the message
+        """
+        try:
+            prompt = self._prepare_prompt(message_id, email_data)
+            return await self.acall_agent(prompt)
         except Exception as e:
             logger.error(f"Error summarizing message {message_id}: {str(e)}")
             raise
 
+    def _prepare_prompt(self, message_id: str, email_data: Dict[str, Any]) -> str:
+        body = email_body(email_data)
+        
+        if not body:
+            logger.warning(f"No email body found for message {message_id}")
+            raise ValueError("No email content found")
+        
+        return self.compose_prompt(body)
+
     def _get_user_rules(self) -> Optional[str]:
         try:
             rules_path = Path(__file__).parent / "user_rules.txt"
             if not rules_path.exists() or rules_path.stat().st_size == 0:
-                logger.info("User rules file is empty or doesn't exist")
+                logger.debug("User rules file is empty or doesn't exist")
                 return None
                 
             with open(rules_path, "r") as f:
                 rules = f.read().strip()
                 
             if not rules:
-                logger.info("User rules file is empty")
+                logger.debug("User rules file is empty")
                 return None
                 
-            logger.info("User rules loaded successfully")
+            logger.debug("User rules loaded successfully")
             return rules
         except Exception as e:
             logger.error(f"Error reading user rules: {str(e)}")
             return None
     
-    def compose_prompt(self, email_text: str) -> str:
-        base_prompt = f"""
-Analyze the following email thoroughly and extract all relevant information, regardless of the email's subject or type. Consider the context of professional, transactional, recruitment, and notification emails. Pay close attention to:
-
-Sender and Recipient: Identify who sent the email and to whom it is addressed.
-
-Subject Line: Note the main topic or purpose as indicated by the subject.
-
-Key Dates and Deadlines: Extract any dates, deadlines, or time-sensitive information.
-
-Action Items: List any required actions, tasks, or next steps for the recipient.
-
-Important Details: Capture critical information such as transaction IDs, reference numbers, application status, job titles, company names, links, or attachments.
-
-Main Content Summary: Briefly summarize the main message or purpose of the email in a few sentences.
-
-Tone and Urgency: Note the tone (e.g., formal, urgent, friendly) and indicate if immediate action is required.
-
-After extracting all relevant information, structure your response in a clear, concise format. If a custom instruction is provided (such as "summarise in 3 points"), ensure each point is information-rich, covering the most important aspects of the email. Each point should be self-contained and provide actionable or notable details, regardless of the email type.  Talk in first person, as if you're the user's assistant.
-
-Always ensure the summary is comprehensive and tailored to the specific content of the email, prioritizing clarity and relevance.
+    def _build_prompt_prefix(self) -> str:
+        if self._user_rules:
+            return f"{self._BASE_PROMPT}\n\nUser Rules:\n{self._user_rules}"
+        return self._BASE_PROMPT
 
-Just output the summary, do not include any other text.
-        """
-        
-        user_rules = None
-        if self.use_memory:
-            user_rules = self._get_user_rules()
-            
-        if user_rules:
-            prompt = f"{base_prompt}\n\nUser Rules:\n{user_rules}\n\nEmail Content:\n{email_text}"
-        else:
-            prompt = f"{base_prompt}\n\nEmail Content:\n{email_text}"
-        
-        return prompt
+    def compose_prompt(self, email_text: str) -> str:
+        return f"{self._prompt_prefix}\n\nEmail Content:\n{email_text}"
 
     def call_agent(self, prompt: str) -> str:
         try:
-            response = self.agent.run(prompt)
+            response = self._new_agent().run(prompt)
             return response.content
         except Exception as e:
             logger.error(f"Error calling agent: {str(e)}")
             raise
+
+    async def acall_agent(self, prompt: str) -> str:
+        try:
+            response = await self._new_agent().arun(prompt)
+            return response.content
+        except Exception as e:
+            logger.error(f"Error calling agent: {str(e)}")
+            raise
+
+    async def astream(self, prompt: str) -> AsyncIterator[str]:
+        """Yield the summary in chunks as Gemini generates it."""
+        try:
+            # stream=True sticks to the Agent it is passed to, so streams get their own
+            async for chunk in await self._new_agent().arun(prompt, stream=True):
+                if chunk.content:
+                    yield chunk.content
+        except Exception as e:
+            logger.error(f"Error streaming agent response: {str(e)}")
+            raise
@@ -1,38 +1,88 @@
-import os
 import logging
-import json
 from typing import Dict, Any, Optional, List
 from pathlib import Path
 
 from agno.agent import Agent
 from agno.models.google import Gemini
-from dotenv import load_dotenv
+from google import genai
+from pydantic import ValidationError
+from app.core.config import get_settings
 from app.services.gmail_client import GmailClient
+from app.agents._body_cleaner import email_body
+from app.agents.schemas import TodoExtraction
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-load_dotenv()
-
 class TodoAgent:
     """Agent that extracts todo items and action items from emails."""
+
+    _BASE_PROMPT = """Extract all todo items, action items, and tasks from the following email.
+        Return a JSON object with the following structure:
+        {
+            "todos": [
+                {
+                    "task": "The task description",
+                    "priority": "high/medium/low",
+                    "due_date": "YYYY-MM-DD or null if not specified",
+                    "assignee": "Person assigned or null if not clear",
+                    "context": "Brief context about the task"
+                }
+            ],
+            "has_action_required": true/false
+        }
+        
+        Priority guidelines:
+        - high: urgent tasks with explicit deadlines or marked as important
+        - medium: tasks with deadlines but not urgent, or standard work items
+        - low: nice-to-have items or FYI tasks
+        
+        Return only valid, parseable JSON. Do not include notes or explanations outside the JSON.
+        If no todos are found, return an empty array for "todos" and set "has_action_required" to false.
+        """
     
-    def __init__(self, use_memory: bool = True):
+    def __init__(
+        self,
+        use_memory: bool = True,
+        gmail_client: Optional[GmailClient] = None,
+        gemini_client: Optional[genai.Client] = None,
+        model_id: str = "gemini-2.0-flash-lite",
+    ):
         self.use_memory = use_memory
-        self.gmail = GmailClient()
+        # Share clients across agents when given, so auth and connection pools are reused
+        self.gmail = gmail_client or GmailClient()
+        # Rules rarely change, so read them once rather than on every prompt
+        self._user_rules = self._get_user_rules() if use_memory else None
+        self._prompt_prefix = self._build_prompt_prefix()
         try:
-            api_key = os.getenv("GEMINI_API_KEY")
+            api_key = get_settings().gemini_api_key
             if not api_key:
                 raise ValueError("GEMINI_API_KEY environment variable not set")
                 
-            self.agent = Agent(
-                model=Gemini(id="gemini-2.0-flash", api_key=api_key),
-                markdown=True
-            )
+            # Built once and shared by every Agent this extractor creates
+            self._gemini_client = gemini_client or genai.Client(api_key=api_key)
+            self._model_id = model_id
         except Exception as e:
             logger.error(f"Failed to initialize Agno agent: {str(e)}")
             raise
 
+    def _new_agent(self) -> Agent:
+        """Build an agno Agent for one call around the shared Gemini client.
+
+        Agents keep per-run state on themselves, so concurrent calls on one
+        Agent get each other's responses. Each call gets its own instead.
+        """
+        # Constrain the response to the extraction schema so it is always parseable JSON
+        return Agent(
+            model=Gemini(
+                id=self._model_id,
+                client=self._gemini_client,
+                generation_config={
+                    "response_mime_type": "application/json",
+                    "response_schema": TodoExtraction,
+                },
+            ),
+        )
+
     def run(self, message_id: str) -> Dict[str, Any]:
         """Run the todo extraction agent on the given message.
         
@@ -47,104 +97,117 @@ class TodoAgent:
         """
         try:
             # Fetch email from Gmail API
-            email_data = self.gmail.get_message(message_id)
-            body = email_data.get("body_plain") or email_data.get("body_html", "")
-            subject = email_data.get("subject", "")
+            email_data = self.gmail.get_message(message_id) or {}
+        except Exception as e:
+            logger.error(f"Error fetching message {message_id}: {str(e)}")
+            raise
+        
+        return self.run_with_body(message_id, email_data)
+
+    def run_with_body(self, message_id: str, email_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Run the todo extraction agent on an already fetched message.
+        
+        Args:
+            message_id: The ID of the message to extract todos from
+            email_data: The processed message, as returned by GmailClient.get_message
             
-            if not body:
-                logger.warning(f"No email body found for message {message_id}")
-                raise ValueError("No email content found")
+        Returns:
+            Dictionary containing structured todo/action items
             
-            prompt = self.compose_prompt(subject, body)
-            todos_data = self.call_agent(prompt)
+        Raises:
+            Exception: If there is an error processing the message
+        """
+        try:
+            prompt = self._prepare_prompt(message_id, email_data)
+            return self.call_agent(prompt)
+        except Exception as e:
+            logger.error(f"Error extracting todos from message {message_id}: {str(e)}")
+            raise
+
+    async def arun_with_body(self, message_id: str, email_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Async variant of run_with_body, awaiting the Gemini call instead of blocking on it.
+        
+        Args:
+            message_id: The ID of the message to extract todos from
+            email_data: The processed message, as returned by GmailClient.get_message
             
-            return todos_data
+        Returns:
+            Dictionary containing structured todo/action items
             
+        Raises:
+            Exception: If there is an error processing the message
+        """
+        try:
+            prompt = self._prepare_prompt(message_id, email_data)
+            return await self.acall_agent(prompt)
         except Exception as e:
             logger.error(f"Error extracting todos from message {message_id}: {str(e)}")
             raise
 
+    def _prepare_prompt(self, message_id: str, email_data: Dict[str, Any]) -> str:
+        body = email_body(email_data)
+        subject = email_data.get("subject", "")
+        
+        if not body:
+            logger.warning(f"No email body found for message {message_id}")
+            raise ValueError("No email content found")
+        
+        return self.compose_prompt(subject, body)
+
     def _get_user_rules(self) -> Optional[str]:
         try:
             rules_path = Path(__file__).parent / "todo_rules.txt"
             if not rules_path.exists() or rules_path.stat().st_size == 0:
-                logger.info("Todo rules file is empty or doesn't exist")
+                logger.debug("Todo rules file is empty or doesn't exist")
                 return None
                 
             with open(rules_path, "r") as f:
                 rules = f.read().strip()
                 
             if not rules:
-                logger.info("Todo rules file is empty")
+                logger.debug("Todo rules file is empty")
                 return None
                 
-            logger.info("Todo rules loaded successfully")
+            logger.debug("Todo rules loaded successfully")
             return rules
         except Exception as e:
             logger.error(f"Error reading todo rules: {str(e)}")
             return None
     
+    def _build_prompt_prefix(self) -> str:
+        if self._user_rules:
+            return f"{self._BASE_PROMPT}\n\nUser Rules:\n{self._user_rules}"
+        return self._BASE_PROMPT
+
     def compose_prompt(self, subject: str, email_text: str) -> str:
-        base_prompt = f"""Extract all todo items, action items, and tasks from the following email.
-        Return a JSON object with the following structure:
-        {{
-            "todos": [
-                {{
-                    "task": "The task description",
-                    "priority": "high/medium/low",
-                    "due_date": "YYYY-MM-DD or null if not specified",
-                    "assignee": "Person assigned or null if not clear",
-                    "context": "Brief context about the task"
-                }}
-            ],
-            "has_action_required": true/false
-        }}
-        
-        Priority guidelines:
-        - high: urgent tasks with explicit deadlines or marked as important
-        - medium: tasks with deadlines but not urgent, or standard work items
-        - low: nice-to-have items or FYI tasks
-        
-        Return only valid, parseable JSON. Do not include notes or explanations outside the JSON.
-        If no todos are found, return an empty array for "todos" and set "has_action_required" to false.
-        """
-        
-        user_rules = None
-        if self.use_memory:
-            user_rules = self._get_user_rules()
-            
-        if user_rules:
-            prompt = f"{base_prompt}\n\nUser Rules:\n{user_rules}\n\nEmail Subject: {subject}\n\nEmail Content:\n{email_text}"
-        else:
-            prompt = f"{base_prompt}\n\nEmail Subject: {subject}\n\nEmail Content:\n{email_text}"
-        
-        return prompt
+        return f"{self._prompt_prefix}\n\nEmail Subject: {subject}\n\nEmail Content:\n{email_text}"
 
     def call_agent(self, prompt: str) -> Dict[str, Any]:
         try:
-            response = self.agent.run(prompt)
-            # Parse the JSON response
-            try:
-                # Strip any markdown code block markers if present
-                content = response.content.strip()
-                if content.startswith("```json"):
-                    content = content[7:].strip()
-                if content.startswith("```"):
-                    content = content[3:].strip()
-                if content.endswith("```"):
-                    content = content[:-3].strip()
-                
-                todos_data = json.loads(content)
-                return todos_data
-            except json.JSONDecodeError as e:
-                logger.error(f"Failed to parse JSON response: {str(e)}")
-                # Return a structured error response
-                return {
-                    "error": "Failed to parse todo data",
-                    "raw_response": response.content,
-                    "todos": [],
-                    "has_action_required": False
-                }
+            response = self._new_agent().run(prompt)
+            return self._parse_response(response.content)
+        except Exception as e:
+            logger.error(f"Error calling agent: {str(e)}")
+            raise
+
+    async def acall_agent(self, prompt: str) -> Dict[str, Any]:
+        try:
+            response = await self._new_agent().arun(prompt)
+            return self._parse_response(response.content)
         except Exception as e:
             logger.error(f"Error calling agent: {str(e)}")
             raise
+
+    def _parse_response(self, content: str) -> Dict[str, Any]:
+        # Parse and validate the JSON response
+        try:
+            return TodoExtraction.model_validate_json(content).model_dump()
+        except ValidationError as e:
+            logger.error(f"Failed to parse JSON response: {str(e)}")
+            # Return a structured error response
+            return {
+                "error": "Failed to parse todo data",
+                "raw_response": content,
+                "todos": [],
+                "has_action_required": False
+            }
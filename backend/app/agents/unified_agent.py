@@ -0,0 +1,305 @@
+import logging
+from typing import Dict, Any, List, Optional
+from pathlib import Path
+from datetime import date
+
+from agno.agent import Agent
+from agno.models.google import Gemini
+from google import genai
+from pydantic import TypeAdapter, ValidationError
+from app.core.config import get_settings
+from app.services.gmail_client import GmailClient
+from app.agents._body_cleaner import email_body
+from app.agents.schemas import UnifiedExtraction
+
+logger = logging.getLogger(__name__)
+
+# Rules files of the single-purpose agents, keyed by the prompt section they apply to
+RULES_FILES = {
+    "Summary": "user_rules.txt",
+    "Finance": "finance_rules.txt",
+    "Todos": "todo_rules.txt",
+    "Reminders": "reminder_rules.txt",
+}
+
+_BATCH_ADAPTER = TypeAdapter(List[UnifiedExtraction])
+
+class UnifiedAgent:
+    """Agent that summarizes an email and extracts finance, todo and reminder data in one call.
+
+    The email is sent to Gemini once instead of once per extraction, and the
+    response is constrained to the UnifiedExtraction JSON schema.
+    """
+
+    _BASE_PROMPT = """Analyze the following email and complete all four tasks below in a single JSON response.
+        Today's date is {today}.
+
+        Summary:
+        Summarize the email for the user, talking in first person as if you're the user's assistant.
+        Cover the sender, the purpose of the email, key dates and deadlines, required actions, important
+        details (transaction IDs, reference numbers, application status, company names, links) and the
+        tone or urgency. Just write the summary text.
+
+        Finance:
+        Extract structured financial information (leave fields null if not found):
+        - amount: monetary amount debited or credited
+        - account_numbers: account or card numbers (partially masked if present)
+        - transaction_purpose: purchase, refund, payment, bill, statement, etc.
+        - transaction_type: credit or debit
+        - due_date: any payment due date in YYYY-MM-DD format
+        - merchant: name of the merchant or company involved. clean it up for easier reading.
+        - category: spending category (e.g., dining, travel, utilities, etc.). extract from merchant.
+
+        Todos:
+        Extract all todo items, action items, and tasks. Priority guidelines:
+        - high: urgent tasks with explicit deadlines or marked as important
+        - medium: tasks with deadlines but not urgent, or standard work items
+        - low: nice-to-have items or FYI tasks
+        Dates use YYYY-MM-DD. Set has_action_required to false if there are no todos.
+
+        Reminders:
+        Extract reminders, scheduled events, meetings, deadlines, and important dates. Only extract
+        genuine reminders and scheduled events - not generic mentions of dates or times. Dates use
+        YYYY-MM-DD and times HH:MM. Set has_time_sensitive_content to false if there are no reminders.
+        """
+
+    _BATCH_PROMPT = """The {count} emails below are unrelated. Complete the tasks above for each email
+        independently and return a JSON array with exactly one object per email, in the order the
+        emails are given."""
+
+    def __init__(
+        self,
+        use_memory: bool = True,
+        gmail_client: Optional[GmailClient] = None,
+        gemini_client: Optional[genai.Client] = None,
+        model_id: str = "gemini-2.0-flash",
+    ):
+        self.use_memory = use_memory
+        # Share clients across agents when given, so auth and connection pools are reused
+        self.gmail = gmail_client or GmailClient()
+        # Rules rarely change, so read them once rather than on every prompt
+        self._user_rules = self._load_user_rules() if use_memory else {}
+        # Built lazily and rebuilt when the date in the prompt changes
+        self._prompt_prefix = None
+        self._prompt_prefix_date = None
+        try:
+            api_key = get_settings().gemini_api_key
+            if not api_key:
+                raise ValueError("GEMINI_API_KEY environment variable not set")
+
+            # Built once and shared by every Agent this extractor creates
+            self._gemini_client = gemini_client or genai.Client(api_key=api_key)
+            self._model_id = model_id
+        except Exception as e:
+            logger.error(f"Failed to initialize Agno agent: {str(e)}")
+            raise
+
+    def _new_agent(self, batch: bool = False) -> Agent:
+        """Build an agno Agent for one call around the shared Gemini client.
+
+        Agents keep per-run state on themselves, so concurrent calls on one
+        Agent (several length buckets, or the per-email fallback) get each
+        other's responses. Each call gets its own instead.
+
+        Args:
+            batch: Constrain the response to a list of results, for prompts carrying several emails
+        """
+        return Agent(
+            model=Gemini(
+                id=self._model_id,
+                client=self._gemini_client,
+                generation_config={
+                    "response_mime_type": "application/json",
+                    "response_schema": List[UnifiedExtraction] if batch else UnifiedExtraction,
+                },
+            ),
+        )
+
+    def run(self, message_id: str) -> Dict[str, Any]:
+        """Run the unified extraction agent on the given message.
+
+        Args:
+            message_id: The ID of the message to process
+
+        Returns:
+            Dictionary with "summary", "finance", "todos" and "reminders" keys
+
+        Raises:
+            Exception: If there is an error processing the message
+        """
+        try:
+            # Fetch email from Gmail API
+            email_data = self.gmail.get_message(message_id) or {}
+        except Exception as e:
+            logger.error(f"Error fetching message {message_id}: {str(e)}")
+            raise
+
+        return self.run_with_body(message_id, email_data)
+
+    def run_with_body(
+        self,
+        message_id: str,
+        email_data: Dict[str, Any],
+        today: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Run the unified extraction agent on an already fetched message.
+
+        Args:
+            message_id: The ID of the message to process
+            email_data: The processed message, as returned by GmailClient.get_message
+            today: Today's date as YYYY-MM-DD; batch callers compute it once for all emails
+
+        Returns:
+            Dictionary with "summary", "finance", "todos" and "reminders" keys
+
+        Raises:
+            Exception: If there is an error processing the message
+        """
+        try:
+            prompt = self._prepare_prompt(message_id, email_data, today)
+            return self.call_agent(prompt)
+        except Exception as e:
+            logger.error(f"Error running unified extraction on message {message_id}: {str(e)}")
+            raise
+
+    async def arun_with_body(
+        self,
+        message_id: str,
+        email_data: Dict[str, Any],
+        today: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Async variant of run_with_body, awaiting the Gemini call instead of blocking on it.
+
+        Args:
+            message_id: The ID of the message to process
+            email_data: The processed message, as returned by GmailClient.get_message
+            today: Today's date as YYYY-MM-DD; batch callers compute it once for all emails
+
+        Returns:
+            Dictionary with "summary", "finance", "todos" and "reminders" keys
+
+        Raises:
+            Exception: If there is an error processing the message
+        """
+        try:
+            prompt = self._prepare_prompt(message_id, email_data, today)
+            return await self.acall_agent(prompt)
+        except Exception as e:
+            logger.error(f"Error running unified extraction on message {message_id}: {str(e)}")
+            raise
+
+    def run_many(self, emails: List[Dict[str, Any]], today: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Run the unified extraction agent on several fetched messages in one Gemini call.
+
+        Args:
+            emails: Processed messages, as returned by GmailClient.get_message
+            today: Today's date as YYYY-MM-DD; batch callers compute it once for all emails
+
+        Returns:
+            One result dictionary per message, in the order of emails
+
+        Raises:
+            ValueError: If a message has no body or the response does not hold one valid result per message
+        """
+        response = self._new_agent(batch=True).run(self._prepare_batch_prompt(emails, today))
+        return self._parse_batch_response(response.content, len(emails))
+
+    async def arun_many(self, emails: List[Dict[str, Any]], today: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Async variant of run_many, awaiting the Gemini call instead of blocking on it."""
+        response = await self._new_agent(batch=True).arun(self._prepare_batch_prompt(emails, today))
+        return self._parse_batch_response(response.content, len(emails))
+
+    def _prepare_prompt(self, message_id: str, email_data: Dict[str, Any], today: Optional[str] = None) -> str:
+        body = email_body(email_data)
+        subject = email_data.get("subject", "")
+        date_str = email_data.get("date", "")
+
+        if not body:
+            logger.warning(f"No email body found for message {message_id}")
+            raise ValueError("No email content found")
+
+        return self.compose_prompt(subject, body, date_str, today)
+
+    def _prepare_batch_prompt(self, emails: List[Dict[str, Any]], today: Optional[str] = None) -> str:
+        sections = [self._get_prompt_prefix(today), self._BATCH_PROMPT.format(count=len(emails))]
+        for index, email_data in enumerate(emails, start=1):
+            body = email_body(email_data)
+            if not body:
+                raise ValueError(f"No email content found for message {email_data.get('id')}")
+            sections.append(
+                f"Email {index}:\n\nEmail Subject: {email_data.get('subject', '')}\n\n"
+                f"Email Date: {email_data.get('date', '')}\n\nEmail Content:\n{body}"
+            )
+        return "\n\n".join(sections)
+
+    def _parse_batch_response(self, content: str, expected: int) -> List[Dict[str, Any]]:
+        try:
+            results = _BATCH_ADAPTER.validate_json(content)
+        except ValidationError as e:
+            logger.error(f"Failed to parse batched unified extraction response: {str(e)}")
+            raise ValueError("Failed to parse batched unified extraction data") from e
+
+        if len(results) != expected:
+            raise ValueError(f"Expected {expected} extraction results, got {len(results)}")
+        return [result.model_dump() for result in results]
+
+    def _get_user_rules(self, filename: str) -> Optional[str]:
+        try:
+            rules_path = Path(__file__).parent / filename
+            if not rules_path.exists() or rules_path.stat().st_size == 0:
+                return None
+
+            with open(rules_path, "r") as f:
+                rules = f.read().strip()
+
+            return rules or None
+        except Exception as e:
+            logger.error(f"Error reading rules file {filename}: {str(e)}")
+            return None
+
+    def _load_user_rules(self) -> Dict[str, str]:
+        rules_by_section = {}
+        for section, filename in RULES_FILES.items():
+            rules = self._get_user_rules(filename)
+            if rules:
+                rules_by_section[section] = rules
+        return rules_by_section
+
+    def _build_prompt_prefix(self, today: str) -> str:
+        sections = [self._BASE_PROMPT.format(today=today)]
+        for section, rules in self._user_rules.items():
+            sections.append(f"User Rules ({section}):\n{rules}")
+        return "\n\n".join(sections)
+
+    def _get_prompt_prefix(self, today: Optional[str] = None) -> str:
+        today = today or date.today().isoformat()
+        if today != self._prompt_prefix_date:
+            self._prompt_prefix = self._build_prompt_prefix(today)
+            self._prompt_prefix_date = today
+        return self._prompt_prefix
+
+    def compose_prompt(self, subject: str, email_text: str, date_str: str, today: Optional[str] = None) -> str:
+        return f"{self._get_prompt_prefix(today)}\n\nEmail Subject: {subject}\n\nEmail Date: {date_str}\n\nEmail Content:\n{email_text}"
+
+    def call_agent(self, prompt: str) -> Dict[str, Any]:
+        try:
+            response = self._new_agent().run(prompt)
+            return self._parse_response(response.content)
+        except Exception as e:
+            logger.error(f"Error calling agent: {str(e)}")
+            raise
+
+    async def acall_agent(self, prompt: str) -> Dict[str, Any]:
+        try:
+            response = await self._new_agent().arun(prompt)
+            return self._parse_response(response.content)
+        except Exception as e:
+            logger.error(f"Error calling agent: {str(e)}")
+            raise
+
+    def _parse_response(self, content: str) -> Dict[str, Any]:
+        try:
+            return UnifiedExtraction.model_validate_json(content).model_dump()
+        except ValidationError as e:
+            logger.error(f"Failed to parse unified extraction response: {str(e)}")
+            raise ValueError("Failed to parse unified extraction data") from e
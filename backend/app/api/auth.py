@@ -2,10 +2,40 @@
 from fastapi import APIRouter, Request, HTTPException
 from fastapi.responses import RedirectResponse, JSONResponse, HTMLResponse
 from app.core import auth as core_auth
+from cachetools import TTLCache
+from datetime import datetime, timedelta, timezone
+import asyncio
+import hashlib
 import logging
+import threading
 
 router = APIRouter()
 
+# Tokens with less than this left are refreshed in the background
+TOKEN_STALE_WINDOW = timedelta(minutes=3)
+_refresh_lock = asyncio.Lock()
+_background_refreshes = set()
+
+# User info by access-token hash, so frontends polling /me do not hit Google every time.
+# Keyed by a hash rather than the raw token so tokens are not kept as cache keys.
+_userinfo_cache = TTLCache(maxsize=10000, ttl=300)
+_userinfo_cache_lock = threading.Lock()
+
+def _get_user_info_cached(access_token: str) -> dict:
+    """
+    Return user info for an access token, from the cache when possible.
+    Failed lookups raise and are not cached.
+    """
+    key = hashlib.sha256(access_token.encode()).hexdigest()[:32]
+    with _userinfo_cache_lock:
+        user_info = _userinfo_cache.get(key)
+    if user_info is not None:
+        return user_info
+    user_info = core_auth.get_user_info(access_token)
+    with _userinfo_cache_lock:
+        _userinfo_cache[key] = user_info
+    return user_info
+
 @router.get("/login")
 def login():
     """
@@ -50,28 +80,89 @@ def callback(request: Request):
         """
         return HTMLResponse(content=error_html, status_code=400)
 
+def _token_state(token: dict) -> str:
+    """
+    Classify a token as "fresh", "stale" (close to expiry) or "expired".
+    Tokens without a recorded expiry are treated as fresh; a failed lookup still falls back to a refresh.
+    """
+    expiry = token.get("expiry")
+    if not expiry:
+        return "fresh"
+    expires_at = datetime.fromisoformat(expiry)
+    if expires_at.tzinfo is None:
+        # google-auth records expiry as naive UTC
+        expires_at = expires_at.replace(tzinfo=timezone.utc)
+    remaining = expires_at - datetime.now(timezone.utc)
+    if remaining <= timedelta(0):
+        return "expired"
+    if remaining <= TOKEN_STALE_WINDOW:
+        return "stale"
+    return "fresh"
+
+def _refresh_and_save(token: dict) -> dict:
+    """Refresh the access token, record its expiry and persist the merged token."""
+    new_token = core_auth.refresh_access_token(token["refresh_token"])
+    merged = {**token, **new_token}
+    if "expires_in" in new_token:
+        # Naive UTC without an offset, the format google-auth writes and parses back
+        expires_at = datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(seconds=new_token["expires_in"])
+        merged["expiry"] = expires_at.isoformat()
+    core_auth.save_token(merged)
+    return merged
+
+async def _refresh_token(token: dict) -> dict:
+    """
+    Refresh the stored token, allowing a single refresh in flight at a time.
+    If another request refreshed it while we waited for the lock, that token is used instead.
+    """
+    async with _refresh_lock:
+        current = await asyncio.to_thread(core_auth.load_token) or token
+        if current.get("access_token") != token.get("access_token") and _token_state(current) == "fresh":
+            return current
+        return await asyncio.to_thread(_refresh_and_save, current)
+
+async def refresh_in_background(token: dict) -> None:
+    """Refresh a stale token without holding up the request that noticed it."""
+    try:
+        await _refresh_token(token)
+    except Exception as e:
+        logging.warning(f"/auth/me: Background token refresh failed: {e}")
+
 @router.get("/me")
-def me():
+async def me():
     """
-    Get user info from token. Optionally refresh token if needed.
+    Get user info from token, refreshing the token when needed.
+    Fresh tokens are used as-is, stale ones are refreshed in the background while
+    the current token serves the request, and expired ones are refreshed first.
     Returns 401 if not authenticated or token expired and cannot be refreshed.
     """
-    token = core_auth.load_token()
+    token = await asyncio.to_thread(core_auth.load_token)
     if not token:
         raise HTTPException(status_code=401, detail="Not authenticated. Please log in via /auth/login.")
+    refresh_token = token.get("refresh_token")
+    state = _token_state(token)
+    if state == "expired" and refresh_token:
+        try:
+            token = await _refresh_token(token)
+        except Exception as e:
+            logging.error(f"/auth/me: Token refresh failed: {e}")
+            raise HTTPException(status_code=401, detail="Token expired and refresh failed. Please re-authenticate.")
+    elif state == "stale" and refresh_token:
+        task = asyncio.create_task(refresh_in_background(token))
+        # Keep a reference so the task is not garbage collected before it finishes
+        _background_refreshes.add(task)
+        task.add_done_callback(_background_refreshes.discard)
     access_token = token.get("access_token")
     try:
-        user_info = core_auth.get_user_info(access_token)
+        user_info = await asyncio.to_thread(_get_user_info_cached, access_token)
         return user_info
     except Exception as e:
         logging.warning(f"/auth/me: Access token failed, attempting refresh. Error: {e}")
-        refresh_token = token.get("refresh_token")
         if refresh_token:
             try:
-                new_token = core_auth.refresh_access_token(refresh_token)
-                core_auth.save_token({**token, **new_token})
-                access_token = new_token.get("access_token")
-                user_info = core_auth.get_user_info(access_token)
+                token = await _refresh_token(token)
+                access_token = token.get("access_token")
+                user_info = await asyncio.to_thread(_get_user_info_cached, access_token)
                 return user_info
             except Exception as e2:
                 logging.error(f"/auth/me: Token refresh failed: {e2}")
@@ -0,0 +1,83 @@
+# backend/app/api/deps.py
+"""
+Shared clients and agents for the API routes.
+
+Each factory builds its object on first use and returns the same instance
+afterwards, so routes share one Gmail client, one Gemini client and one
+instance of each agent. Tests can swap any of them through
+app.dependency_overrides.
+
+The agent singletons hold only the shared clients, their rules and model
+settings. Each call builds its own agno Agent and drops it afterwards. Runs,
+and the email bodies in their prompts, are therefore not kept in a
+process-wide memory or shared between concurrent requests.
+"""
+from functools import lru_cache
+
+from google import genai
+
+from app.core.config import get_settings
+from app.services.gmail_client import GmailClient
+from app.agents.summarizer import SummarizerAgent
+from app.agents.finance_agent import FinanceAgent
+from app.agents.todo_agent import TodoAgent
+from app.agents.reminder_agent import ReminderAgent
+from app.agents.unified_agent import UnifiedAgent
+from app.agents.batch_processor_agent import BatchProcessorAgent
+
+
+@lru_cache(maxsize=1)
+def get_gmail_client() -> GmailClient:
+    return GmailClient()
+
+
+@lru_cache(maxsize=1)
+def get_gemini_client() -> genai.Client:
+    # One Gemini client shared by all agents so they reuse a single connection pool
+    return genai.Client(api_key=get_settings().gemini_api_key)
+
+
+@lru_cache(maxsize=1)
+def get_summarizer() -> SummarizerAgent:
+    return SummarizerAgent(gmail_client=get_gmail_client(), gemini_client=get_gemini_client())
+
+
+@lru_cache(maxsize=1)
+def get_finance_agent() -> FinanceAgent:
+    return FinanceAgent(gmail_client=get_gmail_client(), gemini_client=get_gemini_client())
+
+
+@lru_cache(maxsize=1)
+def get_todo_agent() -> TodoAgent:
+    return TodoAgent(gmail_client=get_gmail_client(), gemini_client=get_gemini_client())
+
+
+@lru_cache(maxsize=1)
+def get_reminder_agent() -> ReminderAgent:
+    return ReminderAgent(gmail_client=get_gmail_client(), gemini_client=get_gemini_client())
+
+
+@lru_cache(maxsize=1)
+def get_unified_agent() -> UnifiedAgent:
+    return UnifiedAgent(gmail_client=get_gmail_client(), gemini_client=get_gemini_client())
+
+
+@lru_cache(maxsize=1)
+def get_lite_unified_agent() -> UnifiedAgent:
+    return UnifiedAgent(
+        gmail_client=get_gmail_client(), gemini_client=get_gemini_client(), model_id="gemini-2.0-flash-lite"
+    )
+
+
+@lru_cache(maxsize=1)
+def get_batch_agent() -> BatchProcessorAgent:
+    return BatchProcessorAgent(
+        get_gmail_client(),
+        get_summarizer(),
+        get_finance_agent(),
+        get_todo_agent(),
+        get_reminder_agent(),
+        unified_agent=get_unified_agent(),
+        lite_unified_agent=get_lite_unified_agent(),
+        max_concurrency=get_settings().llm_concurrency,
+    )
@@ -1,35 +1,123 @@
 # backend/app/api/email.py
-from fastapi import APIRouter, HTTPException, Query, Path, Body, Depends
+import asyncio
+import hashlib
+import logging
+import threading
+from concurrent.futures import Future
+from cachetools import TTLCache
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Query, Path, Body, Depends, Request, Response
+from fastapi.responses import StreamingResponse
 from typing import List, Optional, Dict, Any
 from sqlalchemy.orm import Session
+from pydantic_core import to_json
 
-from app.services.gmail_client import GmailClient
+from app.core.responses import FastJSONResponse
+from app.services.gmail_client import GmailClient, UNREAD_LABEL
 from app.agents.summarizer import SummarizerAgent
 from app.agents.finance_agent import FinanceAgent
 from app.agents.todo_agent import TodoAgent
 from app.agents.reminder_agent import ReminderAgent
 from app.agents.batch_processor_agent import BatchProcessorAgent
+from app.agents._body_cleaner import clean_body
+from app.api.deps import (
+    get_gmail_client,
+    get_summarizer,
+    get_finance_agent,
+    get_todo_agent,
+    get_reminder_agent,
+    get_batch_agent,
+)
 
 # Import database dependencies
-from app.db.database import get_db
-from app.db.repositories import EmailRepository, LabelRepository, ReminderRepository, TodoRepository, FinanceRepository
+from app.db.database import SessionLocal, get_db
+from app.db.repositories import EmailRepository, LabelRepository, ReminderRepository, TodoRepository, FinanceRepository, FailedGmailOpRepository
 from app.models.email import Email, Label, Reminder, Todo, FinanceData
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
-gmail_client = GmailClient()
-batch_agent = BatchProcessorAgent(
-    gmail_client,
-    SummarizerAgent(),
-    FinanceAgent(),
-    TodoAgent(),
-    ReminderAgent(),
-)
+
+# Agent results for the single-message GET endpoints, keyed by (agent, message ID).
+# A Gmail message never changes once sent, so re-running the model on it is wasted work.
+_extraction_cache = TTLCache(maxsize=2048, ttl=3600)
+_extraction_cache_lock = threading.Lock()
+
+# Summaries of content posted to /summarize-content, keyed by a hash of the content,
+# so drafts and retries with identical text do not re-run the model
+_summary_cache = TTLCache(maxsize=2000, ttl=86400)
+_summary_cache_lock = threading.Lock()
+
+# A successful /test is remembered briefly, so connectivity checks answer without Gmail
+_connection_test_cache = TTLCache(maxsize=1, ttl=300)
+
+# Clients may reuse message and label responses briefly without revalidating
+CACHE_CONTROL = "private, max-age=60"
+
+def _not_modified(request: Request, etag: str) -> bool:
+    """Whether the client's If-None-Match already names this ETag."""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    return etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*"
+
+def _message_cache_headers(message_id: str, message: Dict[str, Any]) -> Dict[str, str]:
+    """ETag and Cache-Control headers for a message, keyed on its Gmail historyId."""
+    etag = f'W/"{message_id}-{message.get("history_id")}"'
+    return {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+
+def _sse_event(data: str, event: Optional[str] = None) -> str:
+    """Format a server-sent event; multi-line data is sent as one data field per line."""
+    lines = [f"event: {event}"] if event else []
+    lines.extend(f"data: {line}" for line in data.split("\n"))
+    return "\n".join(lines) + "\n\n"
+
+# Agent runs currently in progress, keyed like _extraction_cache, so concurrent
+# requests for the same message wait for one model call instead of starting their own
+_inflight_extractions: Dict[Any, Future] = {}
+
+def _cached_extraction(agent_name: str, message_id: str, run):
+    """
+    Return the cached result of an agent for a message, running the agent on a miss.
+
+    Only one run per (agent, message) is in flight at a time; concurrent callers
+    wait for it and share its result or exception.
+    """
+    key = (agent_name, message_id)
+    with _extraction_cache_lock:
+        result = _extraction_cache.get(key)
+        if result is not None:
+            return result
+        future = _inflight_extractions.get(key)
+        owner = future is None
+        if owner:
+            future = Future()
+            _inflight_extractions[key] = future
+    
+    if not owner:
+        return future.result()
+    
+    try:
+        result = run(message_id)
+    except Exception as e:
+        with _extraction_cache_lock:
+            del _inflight_extractions[key]
+        future.set_exception(e)
+        raise
+    
+    with _extraction_cache_lock:
+        # Empty results and parse failures are not cached so they are retried
+        if result and not (isinstance(result, dict) and "error" in result):
+            _extraction_cache[key] = result
+        del _inflight_extractions[key]
+    future.set_result(result)
+    return result
 
 @router.post("/batch-process")
-def batch_process_emails(
+async def batch_process_emails(
     max_emails: int = Query(20, description="Maximum number of emails to process"),
     query: str = Query("", description="Gmail search query to filter emails"),
-    db: Session = Depends(get_db)):
+    db: Session = Depends(get_db),
+    batch_agent: BatchProcessorAgent = Depends(get_batch_agent)):
     """
     Process a batch of recent emails through all agents and store results in the database.
     
@@ -45,96 +133,230 @@ def batch_process_emails(
         A dictionary with processing statistics and results
     """
     try:
-        result = batch_agent.process_recent_emails(db, max_emails=max_emails, query=query)
+        result = await batch_agent.process_recent_emails(db, max_emails=max_emails, query=query)
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Batch processing failed: {str(e)}")
 
+def _save_messages(db: Session, messages: List[Dict[str, Any]]) -> None:
+    """Save Gmail messages, their labels and the associations in one transaction."""
+    emails, assocs = [], []
+    label_ids = set()
+    for message in messages:
+        emails.append(EmailRepository.email_row(message))
+        for label_id in message.get('label_ids', []):
+            label_ids.add(label_id)
+            assocs.append({'email_id': message['id'], 'label_id': label_id})
+    
+    # Each label is written once per batch, however many messages carry it
+    labels = [{'label_id': label_id, 'name': label_id, 'type': 'user'} for label_id in label_ids]
+    EmailRepository.bulk_upsert(db, emails, labels, assocs)
+
+def _hydrate_email(gmail: GmailClient, message_id: str) -> None:
+    """Fetch a message from Gmail and fill in its placeholder row, in a session of its own."""
+    db = SessionLocal()
+    try:
+        # The row only needs headers, labels and snippet, so the bodies are not downloaded
+        message = gmail.get_message(message_id, format='metadata')
+        if message:
+            EmailRepository.bulk_upsert(db, [EmailRepository.email_row(message)], [], [])
+    except Exception as e:
+        logger.error(f"Error saving details of message {message_id}: {str(e)}")
+    finally:
+        db.close()
+
+def _apply_label_change(gmail: GmailClient, operation: str, message_id: str, label_id: str) -> None:
+    """Apply a label change in Gmail after the response was sent, recording it for retry on failure."""
+    modify = gmail.add_label_to_message if operation == "add_label" else gmail.remove_label_from_message
+    try:
+        if modify(message_id, label_id):
+            return
+        error = "Gmail rejected the label change"
+    except Exception as e:
+        error = str(e)
+    
+    logger.error(f"Error applying {operation} {label_id} to message {message_id}: {error}")
+    db = SessionLocal()
+    try:
+        FailedGmailOpRepository.record_failure(db, message_id, operation, label_id, error)
+    except Exception as e:
+        logger.error(f"Error recording failed {operation} for message {message_id}: {str(e)}")
+    finally:
+        db.close()
+
+# The Gmail client and the database session are blocking, so the handlers below
+# run those calls in worker threads to keep the event loop free
+
 @router.get("/test")
-def test_email():
+async def test_email(gmail: GmailClient = Depends(get_gmail_client)):
     """
     Test endpoint to check if the backend can connect to Gmail API using current credentials.
     """
     try:
-        labels = gmail_client.get_labels()
-        return {"msg": "Successfully connected to Gmail API", "label_count": len(labels)}
+        result = _connection_test_cache.get("ok")
+        if result is not None:
+            return result
+        labels = await asyncio.to_thread(gmail.get_labels)
+        result = {"msg": "Successfully connected to Gmail API", "label_count": len(labels)}
+        _connection_test_cache["ok"] = result
+        return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Gmail API connection failed: {str(e)}")
 
-@router.get("/labels")
-def get_labels():
-    """Get all Gmail labels for the authenticated user."""
+@router.get("/labels", response_model=None)
+async def get_labels(request: Request, gmail: GmailClient = Depends(get_gmail_client)):
+    """
+    Get all Gmail labels for the authenticated user.
+
+    Responses carry an ETag derived from the label IDs and names; a matching
+    If-None-Match gets a 304 with no body.
+    """
+    try:
+        labels = await asyncio.to_thread(gmail.get_labels)
+        fingerprint = "|".join(sorted(f"{label.get('id')}:{label.get('name')}" for label in labels))
+        etag = f'W/"{hashlib.sha256(fingerprint.encode()).hexdigest()[:32]}"'
+        headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+        if _not_modified(request, etag):
+            return Response(status_code=304, headers=headers)
+        return FastJSONResponse({"labels": labels}, headers=headers)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/labels/by-name/{name}")
+async def get_label_by_name(
+    name: str = Path(..., description="Name of the label, as shown in Gmail"),
+    gmail: GmailClient = Depends(get_gmail_client)):
+    """
+    Get a Gmail label by its name, so clients holding a name can find its ID.
+
+    Served from the client's cached label list; Gmail is only asked when the
+    list is not cached.
+    """
     try:
-        labels = gmail_client.get_labels()
-        return {"labels": labels}
+        label = await asyncio.to_thread(gmail.get_label_by_name, name)
+        if label is None:
+            raise HTTPException(status_code=404, detail=f"Label {name} not found")
+        return {"label": label}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/messages")
-def get_messages(
+# Messages fetched per Gmail batch request when /messages is streamed; small enough
+# that the first rows arrive quickly, large enough to keep the round trips few
+STREAM_CHUNK_SIZE = 10
+
+def _save_messages_in_session(messages: List[Dict[str, Any]]) -> None:
+    """Save messages with a session of their own, for work that outlives the request's session."""
+    db = SessionLocal()
+    try:
+        _save_messages(db, messages)
+    finally:
+        db.close()
+
+async def _stream_messages(gmail: GmailClient, max_results: int, query: str, format: str):
+    """Yield listed messages as server-sent events, one Gmail batch request at a time."""
+    try:
+        message_ids = await asyncio.to_thread(gmail.list_message_ids, max_results=max_results, query=query)
+        for start in range(0, len(message_ids), STREAM_CHUNK_SIZE):
+            chunk_ids = message_ids[start:start + STREAM_CHUNK_SIZE]
+            fetched = await asyncio.to_thread(gmail.batch_get_messages, chunk_ids, format)
+            messages = [fetched[message_id] for message_id in chunk_ids if message_id in fetched]
+            for message in messages:
+                yield _sse_event(to_json(message).decode(), event="message")
+            # Store the chunk after the client has it
+            await asyncio.to_thread(_save_messages_in_session, messages)
+    except Exception as e:
+        yield _sse_event(f"Error retrieving messages: {str(e)}", event="error")
+        return
+    yield _sse_event("", event="done")
+
+@router.get("/messages", response_model=None)
+async def get_messages(
     max_results: int = Query(10, description="Maximum number of messages to return"),
     query: str = Query("", description="Gmail search query"),
-    db: Session = Depends(get_db)):
-    """Get messages from Gmail with optional filtering and save to database."""
+    format: str = Query("metadata", pattern="^(metadata|full)$", description="'full' also returns the message bodies"),
+    stream: bool = Query(False, description="Stream the messages as server-sent events"),
+    db: Session = Depends(get_db),
+    gmail: GmailClient = Depends(get_gmail_client)):
+    """
+    Get messages from Gmail with optional filtering and save to database.
+
+    By default only headers, labels and snippets are fetched, which is all the
+    listing and the database need; pass format=full for the bodies as well.
+    More messages than Gmail lists in one page are read page by page, with the
+    next page listed while the current one is fetched.
+
+    With stream=true the messages are sent as "message" server-sent events, in
+    listing order, as each group of STREAM_CHUNK_SIZE messages arrives from Gmail,
+    followed by a "done" event, so clients can render the first rows early.
+    """
+    if stream:
+        return StreamingResponse(
+            _stream_messages(gmail, max_results, query, format),
+            media_type="text/event-stream"
+        )
+    
     try:
         # Get messages from Gmail API
-        messages = gmail_client.get_messages(max_results=max_results, query=query)
+        messages = await asyncio.to_thread(gmail.get_messages, max_results=max_results, query=query, format=format)
         
-        # Save each message to the database
-        for message in messages:
-            EmailRepository.create_or_update_email(db, message)
-            
-            # If the message has labels, save them too
-            if 'labelIds' in message:
-                for label_id in message['labelIds']:
-                    # First ensure the label exists in our database
-                    label_data = {'id': label_id, 'name': label_id}  # Basic label data
-                    LabelRepository.create_or_update_label(db, label_data)
-                    
-                    # Then associate the label with the email
-                    EmailRepository.add_label_to_email(db, message['id'], label_id)
+        # Save all messages, their labels and the associations in one transaction
+        await asyncio.to_thread(_save_messages, db, messages)
         
-        return {"messages": messages}
+        # Returned as a response directly, skipping jsonable_encoder's walk over every message
+        return FastJSONResponse({"messages": messages})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/messages/{message_id}")
-def get_message(
+@router.get("/messages/{message_id}", response_model=None)
+async def get_message(
+    request: Request,
     message_id: str = Path(..., description="ID of the message to retrieve"),
-    db: Session = Depends(get_db)):
-    """Get a specific message by ID and save to database."""
+    db: Session = Depends(get_db),
+    gmail: GmailClient = Depends(get_gmail_client)):
+    """
+    Get a specific message by ID and save to database.
+
+    Responses carry an ETag built from the message's Gmail historyId; a matching
+    If-None-Match gets a 304 with no body and skips the database write. While the
+    message is in the client's cache, the 304 is answered without calling Gmail.
+    """
     try:
-        # Get message from Gmail API
-        message = gmail_client.get_message(message_id)
-        if not message:
-            raise HTTPException(status_code=404, detail=f"Message {message_id} not found")
+        # A cached copy carries the historyId, so revalidation does not reach Gmail
+        message = gmail.get_cached_message(message_id)
+        if message is None:
+            # Get message from Gmail API
+            message = await asyncio.to_thread(gmail.get_message, message_id)
+            if not message:
+                raise HTTPException(status_code=404, detail=f"Message {message_id} not found")
         
-        # Save the message to the database
-        email = EmailRepository.create_or_update_email(db, message)
+        headers = _message_cache_headers(message_id, message)
+        if _not_modified(request, headers["ETag"]):
+            return Response(status_code=304, headers=headers)
         
-        # If the message has labels, save them too
-        if 'labelIds' in message:
-            for label_id in message['labelIds']:
-                # First ensure the label exists in our database
-                label_data = {'id': label_id, 'name': label_id}  # Basic label data
-                LabelRepository.create_or_update_label(db, label_data)
-                
-                # Then associate the label with the email
-                EmailRepository.add_label_to_email(db, message['id'], label_id)
+        # Save the message to the database
+        await asyncio.to_thread(_save_messages, db, [message])
         
-        return {"message": message}
+        return FastJSONResponse({"message": message}, headers=headers)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/messages/{message_id}/labels/{label_id}")
-def add_label(
+async def add_label(
+    background_tasks: BackgroundTasks,
     message_id: str = Path(..., description="ID of the message"),
     label_id: str = Path(..., description="ID of the label to add"),
-    db: Session = Depends(get_db)):
+    db: Session = Depends(get_db),
+    gmail: GmailClient = Depends(get_gmail_client)):
     """
     Add a label to a message and save to database.
 
-    This endpoint adds a specified label to a message with the given ID.
+    This endpoint adds a specified label to a message with the given ID. The database
+    is updated before responding; the Gmail change is applied in the background and
+    recorded in failed_gmail_ops if it fails.
 
     Args:
         message_id: ID of the message to which the label will be added.
@@ -142,34 +364,29 @@ def add_label(
         db: Database session
 
     Returns:
-        A success message if the label was added successfully. Otherwise, raises an HTTPException.
+        A success message once the label change is saved and queued. Otherwise, raises an HTTPException.
     """
     try:
-        # Add label in Gmail
-        success = gmail_client.add_label_to_message(message_id, label_id)
-        if not success:
-            raise HTTPException(status_code=400, detail=f"Failed to add label {label_id} to message {message_id}")
-        
-        # First ensure the email exists in our database
-        email = EmailRepository.get_email_by_id(db, message_id)
-        if not email:
-            # If not in database, get it from Gmail and save it
-            message = gmail_client.get_message(message_id)
-            if message:
-                email = EmailRepository.create_or_update_email(db, message)
+        def save_label():
+            # Ensure the email and label rows exist without reading them first
+            created = EmailRepository.upsert_stub(db, message_id)
+            LabelRepository.ensure_label_cached(db, label_id)
+            
+            # Add the label to the email in our database
+            EmailRepository.add_label_to_email(db, message_id, label_id)
+            return created
         
-        # Ensure the label exists in our database
-        label = LabelRepository.get_label_by_id(db, label_id)
-        if not label:
-            # If not in database, create a basic label record
-            label_data = {'id': label_id, 'name': label_id}  # Basic label data
-            label = LabelRepository.create_or_update_label(db, label_data)
+        created = await asyncio.to_thread(save_label)
         
-        # Add the label to the email in our database
-        EmailRepository.add_label_to_email(db, message_id, label_id)
+        # Add label in Gmail after responding
+        background_tasks.add_task(_apply_label_change, gmail, "add_label", message_id, label_id)
+        if created:
+            # The email was not stored yet; fill in its details once Gmail has the label
+            background_tasks.add_task(_hydrate_email, gmail, message_id)
         
         return {
             "success": True,
+            "queued": True,
             "message_id": message_id,
             "label_id": label_id
         }
@@ -177,25 +394,31 @@ def add_label(
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.delete("/messages/{message_id}/labels/{label_id}")
-def remove_label(
+async def remove_label(
+    background_tasks: BackgroundTasks,
     message_id: str = Path(..., description="ID of the message"),
-    label_id: str = Path(..., description="ID of the label to remove")):
+    label_id: str = Path(..., description="ID of the label to remove"),
+    db: Session = Depends(get_db),
+    gmail: GmailClient = Depends(get_gmail_client)):
     """
     Removes a specified label from a message with the given ID.
 
+    The database is updated before responding; the Gmail change is applied in the
+    background and recorded in failed_gmail_ops if it fails.
+
     Args:
         message_id: ID of the message from which the label will be removed.
         label_id: ID of the label to remove from the message.
 
     Returns:
-        A success message if the label was removed successfully. Otherwise, raises an HTTPException.
+        A success message once the label change is saved and queued. Otherwise, raises an HTTPException.
     """
     try:
-        success = gmail_client.remove_label_from_message(message_id, label_id)
-        if not success:
-            raise HTTPException(status_code=400, detail=f"Failed to remove label {label_id} from message {message_id}")
+        await asyncio.to_thread(EmailRepository.unlink_label, db, message_id, label_id)
+        background_tasks.add_task(_apply_label_change, gmail, "remove_label", message_id, label_id)
         return {
             "success": True,
+            "queued": True,
             "message_id": message_id,
             "label_id": label_id
         }
@@ -203,34 +426,88 @@ def remove_label(
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/messages/{message_id}/mark_read")
-def mark_as_read(message_id: str = Path(..., description="ID of the message")):
+async def mark_as_read(
+    background_tasks: BackgroundTasks,
+    message_id: str = Path(..., description="ID of the message"),
+    db: Session = Depends(get_db),
+    gmail: GmailClient = Depends(get_gmail_client)):
     """
     Mark a message as read by removing the UNREAD label.
+    Returns without calling Gmail when the cached message is already read; otherwise
+    the database is updated and the Gmail change is applied in the background.
     """
     try:
-        success = gmail_client.remove_label_from_message(message_id, "UNREAD")
-        if not success:
-            raise HTTPException(status_code=400, detail=f"Failed to mark message {message_id} as read")
-        return {"success": True, "message_id": message_id}
+        cached = gmail.get_cached_message(message_id)
+        if cached is not None and UNREAD_LABEL not in (cached.get("label_ids") or ()):
+            return {"success": True, "message_id": message_id, "noop": True}
+        await asyncio.to_thread(EmailRepository.set_read, db, message_id, True)
+        background_tasks.add_task(_apply_label_change, gmail, "remove_label", message_id, UNREAD_LABEL)
+        return {"success": True, "queued": True, "message_id": message_id}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/messages/{message_id}/mark_unread")
-def mark_as_unread(message_id: str = Path(..., description="ID of the message")):
+async def mark_as_unread(
+    background_tasks: BackgroundTasks,
+    message_id: str = Path(..., description="ID of the message"),
+    db: Session = Depends(get_db),
+    gmail: GmailClient = Depends(get_gmail_client)):
     """
     Mark a message as unread by adding the UNREAD label.
+    Returns without calling Gmail when the cached message is already unread; otherwise
+    the database is updated and the Gmail change is applied in the background.
     """
     try:
-        success = gmail_client.add_label_to_message(message_id, "UNREAD")
+        cached = gmail.get_cached_message(message_id)
+        if cached is not None and UNREAD_LABEL in (cached.get("label_ids") or ()):
+            return {"success": True, "message_id": message_id, "noop": True}
+        await asyncio.to_thread(EmailRepository.set_read, db, message_id, False)
+        background_tasks.add_task(_apply_label_change, gmail, "add_label", message_id, UNREAD_LABEL)
+        return {"success": True, "queued": True, "message_id": message_id}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/messages/batchModify")
+async def batch_modify_messages(
+    message_ids: List[str] = Body(..., description="IDs of the messages to modify"),
+    add_label_ids: List[str] = Body([], description="IDs of the labels to add"),
+    remove_label_ids: List[str] = Body([], description="IDs of the labels to remove"),
+    gmail: GmailClient = Depends(get_gmail_client)):
+    """
+    Add and remove labels on several messages with a single Gmail request.
+
+    Args:
+        message_ids: IDs of the messages to modify.
+        add_label_ids: IDs of the labels to add to every message.
+        remove_label_ids: IDs of the labels to remove from every message.
+
+    Returns:
+        A success message if the labels were changed. Otherwise, raises an HTTPException.
+    """
+    try:
+        if not add_label_ids and not remove_label_ids:
+            raise HTTPException(status_code=400, detail="No labels to add or remove")
+        success = await asyncio.to_thread(
+            gmail.batch_modify, message_ids, add_label_ids, remove_label_ids
+        )
         if not success:
-            raise HTTPException(status_code=400, detail=f"Failed to mark message {message_id} as unread")
-        return {"success": True, "message_id": message_id}
+            raise HTTPException(status_code=400, detail=f"Failed to modify labels on {len(message_ids)} messages")
+        return {
+            "success": True,
+            "message_ids": message_ids,
+            "add_label_ids": add_label_ids,
+            "remove_label_ids": remove_label_ids
+        }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/messages/{message_id}/summary")
-def summarize_message(message_id: str = Path(..., description="ID of the message to summarize")):
+def summarize_message(
+    message_id: str = Path(..., description="ID of the message to summarize"),
+    summarizer: SummarizerAgent = Depends(get_summarizer)):
     """
     Summarize a specific email message.
 
@@ -241,27 +518,227 @@ def summarize_message(message_id: str = Path(..., description="ID of the message
         A dictionary containing the summary of the message as a string
     """
     try:
-        summary = SummarizerAgent().run(message_id)
+        summary = _cached_extraction("summary", message_id, summarizer.run)
         if not summary:
             raise HTTPException(status_code=404, detail=f"Message {message_id} not found")
         return {"summary": summary}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/messages/{message_id}/analyze")
+async def analyze_message(
+    message_id: str = Path(..., description="ID of the message to analyze"),
+    gmail: GmailClient = Depends(get_gmail_client),
+    summarizer: SummarizerAgent = Depends(get_summarizer),
+    finance_agent: FinanceAgent = Depends(get_finance_agent),
+    todo_agent: TodoAgent = Depends(get_todo_agent),
+    reminder_agent: ReminderAgent = Depends(get_reminder_agent)):
+    """
+    Run all agents on a message in one request.
+
+    The message is fetched from Gmail once and the agents run concurrently, so the
+    request takes about as long as the slowest agent rather than the sum of all four.
+
+    Args:
+        message_id: ID of the message to analyze
+
+    Returns:
+        A dictionary with the summary, finance, todos and reminders results, plus
+        an "errors" dictionary for any agent that failed
+    """
+    try:
+        message = await asyncio.to_thread(gmail.get_message, message_id)
+        if not message:
+            raise HTTPException(status_code=404, detail=f"Message {message_id} not found")
+        
+        agents = {
+            "summary": summarizer,
+            "finance": finance_agent,
+            "todos": todo_agent,
+            "reminders": reminder_agent,
+        }
+        results = await asyncio.gather(
+            *(agent.arun_with_body(message_id, message) for agent in agents.values()),
+            return_exceptions=True
+        )
+        
+        response = {"message_id": message_id, "errors": {}}
+        for name, result in zip(agents, results):
+            if isinstance(result, Exception):
+                response[name] = None
+                response["errors"][name] = str(result)
+            else:
+                response[name] = result
+        return response
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.post("/summarize-content", response_model=str)
-async def summarize_content(content: str = Body(..., embed=True)) -> str:
-    """Summarize email content directly passed in the request body. Used by extension."""
+async def summarize_content(
+    content: str = Body(..., embed=True),
+    stream: bool = Query(False, description="Stream the summary as server-sent events"),
+    summarizer: SummarizerAgent = Depends(get_summarizer)) -> str:
+    """
+    Summarize email content directly passed in the request body. Used by extension.
+
+    With stream=true the summary is sent as server-sent events while Gemini generates
+    it, followed by a "done" event, so clients can show text before it is complete.
+    """
     try:
-        prompt = SummarizerAgent().compose_prompt(content)
-        summary = SummarizerAgent().call_agent(prompt)
+        # Collapse whitespace and cap the length the same way message bodies are prepared,
+        # so very long pages neither bloat the prompt nor miss the cache over spacing
+        content = clean_body(content, None)
+        if not content:
+            raise HTTPException(status_code=400, detail="No content to summarize")
+        content_hash = hashlib.sha256(content.encode()).hexdigest()
+        with _summary_cache_lock:
+            summary = _summary_cache.get(content_hash)
+        
+        prompt = summarizer.compose_prompt(content)
+        if stream:
+            async def events():
+                if summary is not None:
+                    yield _sse_event(summary)
+                else:
+                    chunks = []
+                    try:
+                        async for chunk in summarizer.astream(prompt):
+                            chunks.append(chunk)
+                            yield _sse_event(chunk)
+                    except Exception as e:
+                        yield _sse_event(f"Error during summarization: {str(e)}", event="error")
+                        return
+                    if chunks:
+                        with _summary_cache_lock:
+                            _summary_cache[content_hash] = "".join(chunks)
+                yield _sse_event("", event="done")
+            
+            return StreamingResponse(events(), media_type="text/event-stream")
+        
+        if summary is not None:
+            return summary
+        
+        summary = await summarizer.acall_agent(prompt)
         if not summary:
              raise HTTPException(status_code=500, detail="Summarization failed or returned empty.")
+        with _summary_cache_lock:
+            _summary_cache[content_hash] = summary
         return summary
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error during summarization: {str(e)}")
 
+# Upper bound on concurrent Gemini calls made by one batch extraction request
+BATCH_EXTRACTION_CONCURRENCY = 8
+
+async def _run_agent_batch(agent_name: str, agent, message_ids: List[str], gmail: GmailClient) -> Dict[str, Any]:
+    """
+    Run one agent over several messages.
+
+    Cached results are reused, the remaining messages are fetched with one batched
+    Gmail request, and their agent calls run concurrently. The agent is the shared
+    singleton, but each call builds its own agno Agent, so concurrent calls do not
+    return each other's extractions.
+    """
+    results, errors = {}, {}
+    pending_ids = []
+    with _extraction_cache_lock:
+        for message_id in dict.fromkeys(message_ids):
+            cached = _extraction_cache.get((agent_name, message_id))
+            if cached is not None:
+                results[message_id] = cached
+            else:
+                pending_ids.append(message_id)
+    
+    messages = await asyncio.to_thread(gmail.batch_get_messages, pending_ids) if pending_ids else {}
+    semaphore = asyncio.Semaphore(BATCH_EXTRACTION_CONCURRENCY)
+    
+    async def run_one(message_id):
+        async with semaphore:
+            return await agent.arun_with_body(message_id, messages[message_id])
+    
+    fetched_ids = [message_id for message_id in pending_ids if message_id in messages]
+    outcomes = await asyncio.gather(*(run_one(message_id) for message_id in fetched_ids), return_exceptions=True)
+    for message_id, outcome in zip(fetched_ids, outcomes):
+        if isinstance(outcome, Exception):
+            errors[message_id] = str(outcome)
+            continue
+        results[message_id] = outcome
+        if outcome and not (isinstance(outcome, dict) and "error" in outcome):
+            with _extraction_cache_lock:
+                _extraction_cache[(agent_name, message_id)] = outcome
+    for message_id in pending_ids:
+        if message_id not in messages:
+            errors[message_id] = f"Message {message_id} not found"
+    
+    return {"results": results, "errors": errors}
+
+@router.post("/messages/finance:batch")
+async def extract_finance_batch(
+    ids: List[str] = Body(..., embed=True, description="IDs of the messages to process"),
+    gmail: GmailClient = Depends(get_gmail_client),
+    finance_agent: FinanceAgent = Depends(get_finance_agent)):
+    """
+    Extract financial information from several messages in one request.
+
+    Args:
+        ids: IDs of the messages to process
+
+    Returns:
+        A dictionary with "results" and "errors", both keyed by message ID
+    """
+    try:
+        return await _run_agent_batch("finance", finance_agent, ids, gmail)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/messages/todos:batch")
+async def extract_todos_batch(
+    ids: List[str] = Body(..., embed=True, description="IDs of the messages to process"),
+    gmail: GmailClient = Depends(get_gmail_client),
+    todo_agent: TodoAgent = Depends(get_todo_agent)):
+    """
+    Extract todo items from several messages in one request.
+
+    Args:
+        ids: IDs of the messages to process
+
+    Returns:
+        A dictionary with "results" and "errors", both keyed by message ID
+    """
+    try:
+        return await _run_agent_batch("todos", todo_agent, ids, gmail)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/messages/reminders:batch")
+async def extract_reminders_batch(
+    ids: List[str] = Body(..., embed=True, description="IDs of the messages to process"),
+    gmail: GmailClient = Depends(get_gmail_client),
+    reminder_agent: ReminderAgent = Depends(get_reminder_agent)):
+    """
+    Extract reminders from several messages in one request.
+
+    Unlike the single-message endpoint, the reminders are returned but not saved.
+
+    Args:
+        ids: IDs of the messages to process
+
+    Returns:
+        A dictionary with "results" and "errors", both keyed by message ID
+    """
+    try:
+        return await _run_agent_batch("reminders", reminder_agent, ids, gmail)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/messages/{message_id}/finance")
-def extract_finance(message_id: str = Path(..., description="ID of the message to extract financial information from")):
+def extract_finance(
+    message_id: str = Path(..., description="ID of the message to extract financial information from"),
+    finance_agent: FinanceAgent = Depends(get_finance_agent)):
     """
     Extract financial information from a specific email message.
 
@@ -272,7 +749,7 @@ def extract_finance(message_id: str = Path(..., description="ID of the message t
         A dictionary containing structured financial information
     """
     try:
-        finance_data = FinanceAgent().run(message_id)
+        finance_data = _cached_extraction("finance", message_id, finance_agent.run)
         if not finance_data:
             raise HTTPException(status_code=404, detail=f"Message {message_id} not found or contains no financial information")
         return {"finance_data": finance_data}
@@ -280,7 +757,9 @@ def extract_finance(message_id: str = Path(..., description="ID of the message t
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/messages/{message_id}/todos")
-def extract_todos(message_id: str = Path(..., description="ID of the message to extract todo items from")):
+def extract_todos(
+    message_id: str = Path(..., description="ID of the message to extract todo items from"),
+    todo_agent: TodoAgent = Depends(get_todo_agent)):
     """
     Extract todo items and action items from a specific email message.
 
@@ -291,7 +770,7 @@ def extract_todos(message_id: str = Path(..., description="ID of the message to
         A dictionary containing structured todo items
     """
     try:
-        todos_data = TodoAgent().run(message_id)
+        todos_data = _cached_extraction("todos", message_id, todo_agent.run)
         if not todos_data:
             raise HTTPException(status_code=404, detail=f"Message {message_id} not found or contains no todo items")
         return {"todos_data": todos_data}
@@ -301,7 +780,9 @@ def extract_todos(message_id: str = Path(..., description="ID of the message to
 @router.get("/messages/{message_id}/reminders")
 def extract_reminders(
     message_id: str = Path(..., description="ID of the message to extract reminders from"),
-    db: Session = Depends(get_db)):
+    db: Session = Depends(get_db),
+    gmail: GmailClient = Depends(get_gmail_client),
+    reminder_agent: ReminderAgent = Depends(get_reminder_agent)):
     """
     Extract reminders and scheduled events from a specific email message and save to database.
 
@@ -317,21 +798,25 @@ def extract_reminders(
         email = EmailRepository.get_email_by_id(db, message_id)
         if not email:
             # If not in database, get it from Gmail and save it
-            message = gmail_client.get_message(message_id)
+            message = gmail.get_message(message_id)
             if message:
                 email = EmailRepository.create_or_update_email(db, message)
         
         # Extract reminders using the agent
-        reminders_data = ReminderAgent().run(message_id)
+        reminders_data = _cached_extraction("reminders", message_id, reminder_agent.run)
         if not reminders_data:
             raise HTTPException(status_code=404, detail=f"Message {message_id} not found or contains no reminders")
         
-        # Save reminders to the database
-        saved_reminders = []
-        for reminder in reminders_data:
-            # Create reminder in database
-            db_reminder = ReminderRepository.create_reminder(db, message_id, reminder)
-            saved_reminders.append(db_reminder)
+        # Save reminders to the database in one statement
+        ReminderRepository.bulk_create(db, message_id, [
+            {
+                "description": reminder.get("title", ""),
+                "due_date": reminder.get("date"),
+                "is_completed": False
+            }
+            for reminder in reminders_data.get("reminders") or []
+            if isinstance(reminder, dict) and reminder.get("title")
+        ])
         
         return {"reminders_data": reminders_data}
     except Exception as e:
@@ -1,35 +1,62 @@
 # backend/app/api/reply.py
-from fastapi import APIRouter, HTTPException, Path, Body
-from typing import Dict, Optional
+import asyncio
+from fastapi import APIRouter, HTTPException, Path, Body, Depends
+from typing import Dict, List, Optional
 from pydantic import BaseModel
+from sqlalchemy.orm import Session
 
 from app.services.gmail_client import GmailClient
+from app.api.deps import get_gmail_client
+from app.db.database import get_db
+from app.db.repositories import EmailRepository
 
 router = APIRouter()
 
-# Create a single instance of the Gmail client to be reused
-gmail_client = GmailClient()
+# Upper bound on the messages accepted by one /send-batch request
+MAX_BATCH_SEND = 100
 
 class ReplyRequest(BaseModel):
     """Request model for replying to an email"""
     body_plain: str
     body_html: Optional[str] = None
 
+class SendRequest(BaseModel):
+    """Request model for one new email in a batch send"""
+    to: str
+    subject: str
+    body_plain: str
+    body_html: Optional[str] = None
+    cc: Optional[str] = None
+    bcc: Optional[str] = None
+
 @router.get("/test")
 def test_reply():
     """Simple test endpoint to check if the reply API is working."""
     return {"msg": "Reply endpoint working"}
 
 @router.post("/message/{message_id}")
-def reply_to_message(
+async def reply_to_message(
     message_id: str = Path(..., description="ID of the message to reply to"),
-    reply_data: ReplyRequest = Body(...)):
-    """Reply to a specific email message."""
+    reply_data: ReplyRequest = Body(...),
+    db: Session = Depends(get_db),
+    gmail_client: GmailClient = Depends(get_gmail_client)):
+    """Reply to a specific email message.
+    
+    A stored email already has the sender, subject and thread the reply needs,
+    so Gmail is only asked for the original when it is not in the database.
+    """
     try:
-        reply_id = gmail_client.reply_to_message(
+        email = await asyncio.to_thread(EmailRepository.get_email_by_id, db, message_id)
+        original_message = None
+        if email is not None and email.thread_id and email.sender:
+            original_message = {'thread_id': email.thread_id, 'from': email.sender, 'subject': email.subject}
+        
+        reply_id = await asyncio.to_thread(
+            gmail_client.reply_to_message,
             message_id=message_id,
             body_plain=reply_data.body_plain,
-            body_html=reply_data.body_html
+            body_html=reply_data.body_html,
+            original_message=original_message
         )
         
         if not reply_id:
@@ -40,17 +67,19 @@ def reply_to_message(
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/send")
-def send_email(
+async def send_email(
     to: str = Body(...),
     subject: str = Body(...),
     body_plain: str = Body(...),
     body_html: Optional[str] = Body(None),
     cc: Optional[str] = Body(None),
-    bcc: Optional[str] = Body(None)
+    bcc: Optional[str] = Body(None),
+    gmail_client: GmailClient = Depends(get_gmail_client)
     ):
     """Send a new email message."""
     try:
-        message_id = gmail_client.send_message(
+        message_id = await asyncio.to_thread(
+            gmail_client.send_message,
             to=to,
             subject=subject,
             body_plain=body_plain,
@@ -64,4 +93,32 @@ def send_email(
             
         return {"success": True, "message_id": message_id}
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/send-batch")
+async def send_emails(
+    messages: List[SendRequest] = Body(..., embed=True),
+    gmail_client: GmailClient = Depends(get_gmail_client)
+    ):
+    """Send several new email messages concurrently.
+    
+    The sends run on the Gmail client's worker threads, so the batch takes
+    about as long as its slowest message rather than the sum of all of them.
+    Messages that could not be sent have a null ID in the response.
+    """
+    if len(messages) > MAX_BATCH_SEND:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_SEND} messages can be sent at once")
+    try:
+        message_ids = await asyncio.to_thread(
+            gmail_client.send_messages,
+            [message.model_dump() for message in messages]
+        )
+        
+        if messages and not any(message_ids):
+            raise HTTPException(status_code=400, detail="Failed to send emails")
+            
+        return {"success": all(message_ids), "message_ids": message_ids}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,7 +1,10 @@
 import os
 import json
 import logging
+import threading
 import requests
+from functools import lru_cache
+from requests.adapters import HTTPAdapter
 from pathlib import Path
 from google_auth_oauthlib.flow import Flow
 from typing import Dict, Optional
@@ -22,6 +25,28 @@ SCOPES = [
     'https://www.googleapis.com/auth/userinfo.email'
 ]
 
+# Keep-alive session for Google's OAuth and userinfo endpoints, so calls reuse TLS connections
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(pool_connections=10, pool_maxsize=20))
+
+# Parsed token.json and the modification time it was read at
+_token_cache: Optional[Dict] = None
+_token_mtime: Optional[float] = None
+_token_lock = threading.Lock()
+
+@lru_cache(maxsize=1)
+def _client_config() -> Dict:
+    """Read and parse the OAuth client secrets file once per process."""
+    return json.loads(CREDENTIALS_PATH.read_text())
+
+def _create_flow() -> Flow:
+    """Build an OAuth flow from the cached client config."""
+    return Flow.from_client_config(
+        _client_config(),
+        scopes=SCOPES,
+        redirect_uri=os.environ.get("GOOGLE_REDIRECT_URI", "http://localhost:8000/auth/callback")
+    )
+
 def get_google_auth_url() -> str:
     """
     Returns the Google OAuth2 authorization URL for user login/consent.
@@ -30,11 +55,7 @@ def get_google_auth_url() -> str:
         str: The authorization URL.
     """
     try:
-        flow = Flow.from_client_secrets_file(
-            str(CREDENTIALS_PATH),
-            scopes=SCOPES,
-            redirect_uri=os.environ.get("GOOGLE_REDIRECT_URI", "http://localhost:8000/auth/callback")
-        )
+        flow = _create_flow()
         # Disable PKCE to avoid scope mismatch issues
         flow.autogenerate_code_verifier = False
         auth_url, _ = flow.authorization_url(
@@ -58,11 +79,7 @@ def exchange_code_for_token(code: str) -> Dict:
         Dict: The token dictionary.
     """
     try:
-        flow = Flow.from_client_secrets_file(
-            str(CREDENTIALS_PATH),
-            scopes=SCOPES,
-            redirect_uri=os.environ.get("GOOGLE_REDIRECT_URI", "http://localhost:8000/auth/callback")
-        )
+        flow = _create_flow()
         flow.autogenerate_code_verifier = False
         flow.fetch_token(code=code)
         creds = flow.credentials
@@ -92,7 +109,7 @@ def get_user_info(access_token: str) -> Dict:
     """
     try:
         # Using the OpenID Connect userinfo endpoint
-        resp = requests.get(
+        resp = _session.get(
             "https://openidconnect.googleapis.com/v1/userinfo",
             headers={"Authorization": f"Bearer {access_token}"}
         )
@@ -113,15 +130,14 @@ def refresh_access_token(refresh_token: str) -> Dict:
         Dict: The new token dictionary.
     """
     try:
-        with open(CREDENTIALS_PATH) as f:
-            creds_json = json.load(f)["installed"]
+        creds_json = _client_config()["installed"]
         data = {
             "client_id": creds_json["client_id"],
             "client_secret": creds_json["client_secret"],
             "refresh_token": refresh_token,
             "grant_type": "refresh_token",
         }
-        resp = requests.post("https://oauth2.googleapis.com/token", data=data)
+        resp = _session.post("https://oauth2.googleapis.com/token", data=data)
         resp.raise_for_status()
         return resp.json()
     except requests.RequestException as e:
@@ -130,22 +146,38 @@ def refresh_access_token(refresh_token: str) -> Dict:
 
 def save_token(token_dict: Dict) -> None:
     """
-    Save token dict to TOKEN_PATH.
+    Save token dict to TOKEN_PATH and update the in-memory copy.
 
     Args:
         token_dict (Dict): The token dictionary.
     """
-    with open(TOKEN_PATH, "w") as f:
-        json.dump(token_dict, f)
+    global _token_cache, _token_mtime
+    with _token_lock:
+        with open(TOKEN_PATH, "w") as f:
+            json.dump(token_dict, f)
+        _token_cache = dict(token_dict)
+        _token_mtime = os.path.getmtime(TOKEN_PATH)
 
 def load_token() -> Optional[Dict]:
     """
     Load token dict from TOKEN_PATH.
 
+    The parsed token is kept in memory and only re-read when the file's
+    modification time changes, so repeated calls cost a single stat.
+
     Returns:
         Optional[Dict]: The token dictionary or None if not found.
     """
-    if not TOKEN_PATH.exists():
-        return None
-    with open(TOKEN_PATH) as f:
-        return json.load(f)
\ No newline at end of file
+    global _token_cache, _token_mtime
+    with _token_lock:
+        try:
+            mtime = os.path.getmtime(TOKEN_PATH)
+        except FileNotFoundError:
+            _token_cache, _token_mtime = None, None
+            return None
+        if _token_cache is None or mtime != _token_mtime:
+            with open(TOKEN_PATH) as f:
+                _token_cache = json.load(f)
+            _token_mtime = mtime
+        # Callers merge refreshed fields into the token, so hand out a copy
+        return dict(_token_cache)
@@ -1,15 +1,19 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from functools import lru_cache
 from pydantic_settings import BaseSettings
 from typing import Optional
 
 def setup(app: FastAPI):
+    # An explicit origin pattern, methods and headers keep credentialed CORS valid and
+    # let preflights be answered from the middleware's precomputed headers
     app.add_middleware(
         CORSMiddleware,
-        allow_origins=["*"],  # Replace with frontend domain in prod
+        allow_origin_regex=get_settings().cors_origin_regex,
         allow_credentials=True,
-        allow_methods=["*"],
-        allow_headers=["*"],
+        allow_methods=["GET", "POST", "DELETE"],
+        allow_headers=["Authorization", "Content-Type", "If-None-Match"],
+        expose_headers=["ETag"],
     )
 
 
@@ -20,10 +24,23 @@ class Settings(BaseSettings):
     secret_key: Optional[str] = None
     database_url: Optional[str] = None
     mongo_uri: Optional[str] = None
+    gemini_api_key: Optional[str] = None
+    supabase_pooler_uri: Optional[str] = None
+    # Maximum number of Gemini calls a batch keeps in flight at once (LLM_CONCURRENCY)
+    llm_concurrency: int = 8
+    # Origins allowed to call the API (CORS_ORIGIN_REGEX): the browser extension and local dev servers
+    cors_origin_regex: str = r"^(chrome-extension://[a-p]{32}|https?://(localhost|127\.0\.0\.1)(:\d+)?)$"
 
     class Config:
         env_file = ".env"
         env_file_encoding = 'utf-8'
         extra = "ignore"
-    
-settings = Settings()
\ No newline at end of file
+
+
+@lru_cache
+def get_settings() -> Settings:
+    """Return the process-wide settings, reading the environment and .env file only once."""
+    return Settings()
+
+
+settings = get_settings()
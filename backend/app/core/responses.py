@@ -0,0 +1,17 @@
+from typing import Any
+
+from fastapi.responses import JSONResponse
+from pydantic_core import to_json
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response rendered by pydantic-core's Rust serializer.
+
+    Encodes straight to UTF-8 bytes and is several times faster than the
+    stdlib json module that JSONResponse uses, which matters for endpoints
+    returning lists of full message dicts.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return to_json(content)
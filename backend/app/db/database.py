@@ -1,17 +1,43 @@
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-import os
+from pydantic_core import from_json, to_json
+from app.core.config import get_settings
 
-DATABASE_URL = os.getenv("SUPABASE_POOLER_URI")
+DATABASE_URL = get_settings().supabase_pooler_uri
 if not DATABASE_URL:
     raise RuntimeError("SUPABASE_POOLER_URI environment variable must be set. Place it in your .env file or export it before running the app.")
 
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def _json_serializer(value) -> str:
+    return to_json(value).decode()
+
+# JSON and JSONB columns (email metadata and finance details as JSON, agent results
+# as JSONB) are encoded/decoded by pydantic-core's Rust JSON implementation instead
+# of the stdlib json module.
+# Connections through the Supabase pooler pay TLS and auth on open, so keep a larger
+# pool alive, check connections before use and recycle them before the pooler drops them.
+engine = create_engine(
+    DATABASE_URL,
+    json_serializer=_json_serializer,
+    json_deserializer=from_json,
+    pool_size=20,
+    max_overflow=40,
+    pool_pre_ping=True,
+    pool_recycle=1800,
+    query_cache_size=1200,
+    # Postgres' default, pinned so a pooler or server setting cannot change it underneath
+    isolation_level="READ COMMITTED",
+)
+# Objects stay loaded after commit; repositories commit per call, and expiring on every
+# commit would make the next attribute access reload the row
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
 
 Base = declarative_base()
 
+def create_missing_tables(tables) -> None:
+    """Create the given tables if they do not exist yet; existing tables are left untouched."""
+    Base.metadata.create_all(bind=engine, tables=tables, checkfirst=True)
+
 def get_db():
     db = SessionLocal()
     try:
@@ -1,83 +1,193 @@
-from typing import List, Optional, Dict, Any
-from uuid import uuid4
-from sqlalchemy.orm import Session
+from collections import defaultdict
+from typing import List, Optional, Dict, Any, Iterable, Tuple
+import threading
+from cachetools import TTLCache
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import ProgrammingError
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from datetime import datetime
+from functools import lru_cache
+from uuid import uuid4
 import email.utils
 import logging
 
 logger = logging.getLogger(__name__)
 
-from app.models.email import Email, Label, Reminder, Todo, FinanceData
+from app.services.gmail_client import UNREAD_LABEL
+from app.models.email import Email, Label, Reminder, Todo, FinanceData, AgentResult, FailedGmailOp, email_label_association
+
+# IDs of labels known to exist in the labels table. Gmail's label set is small and
+# rarely changes, so saving a message skips the per-label lookup for cached IDs.
+_known_labels = TTLCache(maxsize=1024, ttl=600)
+_known_labels_lock = threading.Lock()
+
+@lru_cache(maxsize=1024)
+def _parse_date_header(date_str: str) -> Optional[datetime]:
+    """Parse a Date header once per distinct value; replies in a thread often share it."""
+    try:
+        return email.utils.parsedate_to_datetime(date_str)
+    except Exception as e:
+        logger.warning(f"Failed to parse date '{date_str}': {str(e)}")
+        return None
+
+def _parse_email_date(date_str: Optional[str]) -> datetime:
+    """Parse the Date header of a Gmail message, falling back to the current time."""
+    # The current time is never cached, so a missing or malformed date stays accurate
+    return (_parse_date_header(date_str) if date_str else None) or datetime.now()
+
+# Message keys copied as-is into Email columns; derived columns are computed in email_row
+_EMAIL_FIELD_MAP = {
+    'id': 'message_id',
+    'thread_id': 'thread_id',
+    'subject': 'subject',
+    'from': 'sender',
+    'to': 'recipient',
+    'snippet': 'snippet',
+}
+
+def _upsert_emails(rows: List[Dict[str, Any]]):
+    """Build an INSERT ... ON CONFLICT DO UPDATE of email rows, overwriting every column but the key."""
+    stmt = pg_insert(Email).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=[Email.message_id],
+        set_={column: stmt.excluded[column] for column in rows[0] if column != 'message_id'},
+    )
+
+def _commit_or_flush(db: Session, commit: bool) -> None:
+    """Commit, or only flush so the caller can commit many writes at once."""
+    # No refresh after the commit: writes use RETURNING and sessions do not expire on commit
+    if commit:
+        db.commit()
+    else:
+        db.flush()
 
 class EmailRepository:
     """Repository for email-related database operations."""
     
     @staticmethod
-    def create_or_update_email(db: Session, email_data: Dict[str, Any]) -> Email:
+    def create_or_update_email(db: Session, email_data: Dict[str, Any], commit: bool = True) -> Email:
         """
         Create a new email record or update if it already exists.
         
         Args:
             db: Database session
             email_data: Dictionary containing email data from Gmail API
+            commit: Commit the change; False only flushes, leaving the commit to the caller
             
         Returns:
             Email object
         """
-        # Check if email already exists
-        existing_email = db.query(Email).filter(Email.message_id == email_data.get('id')).first()
+        # One INSERT ... ON CONFLICT DO UPDATE instead of a SELECT followed by an INSERT or UPDATE
+        stmt = _upsert_emails([EmailRepository.email_row(email_data)]).returning(Email)
+        email = db.execute(stmt, execution_options={'populate_existing': True}).scalar_one()
+        
+        _commit_or_flush(db, commit)
+        return email
+    
+    @staticmethod
+    def email_row(message: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Map a processed Gmail message to a row of the emails table.
         
-        if existing_email:
-            # Update existing email
-            for key, value in email_data.items():
-                if key == 'id':
-                    continue  # Skip the ID field
-                if hasattr(existing_email, key):
-                    setattr(existing_email, key, value)
+        Args:
+            message: Processed message, as returned by GmailClient.get_message
             
+        Returns:
+            Dictionary of Email column values
+        """
+        row = {column: message.get(key) for key, column in _EMAIL_FIELD_MAP.items()}
+        row['date_received'] = _parse_email_date(message.get('date'))
+        row['is_read'] = UNREAD_LABEL not in (message.get('label_ids') or ())
+        row['has_attachments'] = bool(message.get('attachments'))
+        # Empty metadata is stored as NULL rather than an encoded '{}'
+        row['email_metadata'] = message.get('metadata') or None
+        return row
+    
+    @staticmethod
+    def bulk_upsert(
+        db: Session,
+        emails: List[Dict[str, Any]],
+        labels: List[Dict[str, Any]],
+        assocs: List[Dict[str, str]],
+        commit: bool = True,
+    ) -> None:
+        """
+        Insert or update emails, labels and email-label associations in one transaction.
+        
+        Args:
+            db: Database session
+            emails: Email rows, as built by email_row
+            labels: Label rows with label_id, name and type keys
+            assocs: Association rows with email_id and label_id keys
+            commit: Commit the change; False only executes, leaving the commit to the caller
+        """
+        if emails:
+            # A row may appear only once per ON CONFLICT DO UPDATE statement
+            rows = list({row['message_id']: row for row in emails}.values())
+            db.execute(_upsert_emails(rows))
+        
+        with _known_labels_lock:
+            label_rows = {row['label_id']: row for row in labels if row['label_id'] not in _known_labels}
+        if label_rows:
+            db.execute(
+                pg_insert(Label).values(list(label_rows.values())).on_conflict_do_nothing(index_elements=[Label.label_id])
+            )
+        
+        if assocs:
+            db.execute(pg_insert(email_label_association).values(assocs).on_conflict_do_nothing())
+        
+        if commit:
             db.commit()
-            return existing_email
-        
-        # Create new email
-        # Parse the date string from Gmail to a datetime object
-        date_received = None
-        date_str = email_data.get('date')
-        if date_str:
-            try:
-                # Try parsing with email.utils.parsedate_to_datetime
-                date_received = email.utils.parsedate_to_datetime(date_str)
-            except Exception as e:
-                logger.warning(f"Failed to parse date '{date_str}' with email.utils: {str(e)}")
-                try:
-                    # Fallback: try to parse the date manually
-                    # Remove the (UTC) part if present
-                    date_str = date_str.split(' (')[0].strip()
-                    date_received = datetime.strptime(date_str, '%a, %d %b %Y %H:%M:%S %z')
-                except Exception as e2:
-                    logger.error(f"Failed to parse date '{date_str}' with fallback method: {str(e2)}")
-                    # Use current time as a last resort
-                    date_received = datetime.now()
-        else:
-            # If no date provided, use current time
-            date_received = datetime.now()
+            LabelRepository.mark_labels_known(label_rows)
+    
+    @staticmethod
+    def upsert_stub(db: Session, message_id: str) -> bool:
+        """
+        Insert a placeholder email row unless one already exists, without reading it first.
+        
+        Args:
+            db: Database session
+            message_id: Gmail message ID
             
-        email = Email(
-            message_id=email_data.get('id'),
-            thread_id=email_data.get('threadId'),
-            subject=email_data.get('subject'),
-            sender=email_data.get('from'),
-            recipient=email_data.get('to'),
-            date_received=date_received,
-            snippet=email_data.get('snippet'),
-            is_read=not email_data.get('labelIds', {}).get('UNREAD', False),
-            has_attachments=bool(email_data.get('attachments')),
-            email_metadata=email_data.get('metadata', {})
-        )
+        Returns:
+            True if the row was created and still needs its details, False if it already existed
+        """
+        inserted = db.execute(
+            pg_insert(Email)
+            .values(message_id=message_id)
+            .on_conflict_do_nothing(index_elements=[Email.message_id])
+            .returning(Email.message_id)
+        ).first()
+        db.commit()
+        return inserted is not None
+    
+    @staticmethod
+    def unlink_label(db: Session, message_id: str, label_id: str) -> None:
+        """
+        Remove a label from an email with a single DELETE.
+        
+        Args:
+            db: Database session
+            message_id: Gmail message ID
+            label_id: Gmail label ID
+        """
+        assoc = email_label_association
+        db.execute(delete(assoc).where(assoc.c.email_id == message_id, assoc.c.label_id == label_id))
+        db.commit()
+    
+    @staticmethod
+    def set_read(db: Session, message_id: str, is_read: bool) -> None:
+        """
+        Set the read state of a stored email with a single UPDATE.
         
-        db.add(email)
+        Args:
+            db: Database session
+            message_id: Gmail message ID
+            is_read: Whether the email has been read
+        """
+        db.execute(update(Email).where(Email.message_id == message_id).values(is_read=is_read))
         db.commit()
-        db.refresh(email)
-        return email
     
     @staticmethod
     def get_email_by_id(db: Session, message_id: str) -> Optional[Email]:
@@ -91,7 +201,10 @@ class EmailRepository:
         Returns:
             Email object if found, None otherwise
         """
-        return db.query(Email).filter(Email.message_id == message_id).first()
+        # Callers usually touch the labels next; load them in one extra query instead of lazily
+        return db.scalars(
+            select(Email).options(selectinload(Email.labels)).where(Email.message_id == message_id)
+        ).one_or_none()
     
     @staticmethod
     def get_emails(db: Session, skip: int = 0, limit: int = 100) -> List[Email]:
@@ -106,30 +219,46 @@ class EmailRepository:
         Returns:
             List of Email objects
         """
-        return db.query(Email).order_by(Email.date_received.desc()).offset(skip).limit(limit).all()
+        # Related rows for the whole page come in one query per relationship
+        stmt = (
+            select(Email)
+            .options(
+                selectinload(Email.labels),
+                selectinload(Email.reminders),
+                selectinload(Email.todos),
+                selectinload(Email.finance_data),
+            )
+            .order_by(Email.date_received.desc())
+            .offset(skip)
+            .limit(limit)
+        )
+        return db.scalars(stmt).all()
     
     @staticmethod
-    def add_label_to_email(db: Session, message_id: str, label_id: str) -> bool:
+    def add_label_to_email(db: Session, message_id: str, label_id: str, commit: bool = True) -> bool:
         """
         Add a label to an email.
         
+        Inserts the association by ID in one statement, without loading the email,
+        the label or the email's label collection; the foreign keys ensure both exist.
+        
         Args:
             db: Database session
             message_id: Gmail message ID
             label_id: Gmail label ID
+            commit: Commit the change; False leaves the commit to the caller
             
         Returns:
-            True if successful, False otherwise
+            True if the label was added, False if the email already had it
         """
-        email = EmailRepository.get_email_by_id(db, message_id)
-        label = LabelRepository.get_label_by_id(db, label_id)
-        
-        if not email or not label:
-            return False
-        
-        email.labels.append(label)
-        db.commit()
-        return True
+        result = db.execute(
+            pg_insert(email_label_association)
+            .values(email_id=message_id, label_id=label_id)
+            .on_conflict_do_nothing()
+        )
+        if commit:
+            db.commit()
+        return result.rowcount > 0
     
     @staticmethod
     def remove_label_from_email(db: Session, message_id: str, label_id: str) -> bool:
@@ -160,40 +289,105 @@ class LabelRepository:
     """Repository for label-related database operations."""
     
     @staticmethod
-    def create_or_update_label(db: Session, label_data: Dict[str, Any]) -> Label:
+    def create_or_update_label(db: Session, label_data: Dict[str, Any], commit: bool = True) -> Label:
         """
         Create a new label or update if it already exists.
         
         Args:
             db: Database session
             label_data: Dictionary containing label data from Gmail API
+            commit: Commit the change; False only flushes, leaving the commit to the caller
             
         Returns:
             Label object
         """
-        # Check if label already exists
-        existing_label = db.query(Label).filter(Label.label_id == label_data.get('id')).first()
-        
-        if existing_label:
-            # Update existing label
-            existing_label.name = label_data.get('name', existing_label.name)
-            existing_label.type = label_data.get('type', existing_label.type)
-            
-            db.commit()
-            return existing_label
-        
-        # Create new label
-        label = Label(
+        # One INSERT ... ON CONFLICT DO UPDATE; an existing label keeps the fields label_data leaves out
+        stmt = pg_insert(Label).values(
             label_id=label_data.get('id'),
             name=label_data.get('name'),
             type=label_data.get('type', 'user')
         )
+        set_ = {key: stmt.excluded[key] for key in ('name', 'type') if key in label_data}
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Label.label_id],
+            # RETURNING only yields conflicting rows that were updated, so always set something
+            set_=set_ or {'label_id': stmt.excluded.label_id},
+        ).returning(Label)
+        label = db.execute(stmt, execution_options={'populate_existing': True}).scalar_one()
         
-        db.add(label)
-        db.commit()
-        db.refresh(label)
+        _commit_or_flush(db, commit)
+        if commit:
+            # An uncommitted label could still be rolled back
+            LabelRepository.mark_labels_known([label.label_id])
         return label
     
+    @staticmethod
+    def ensure_label_cached(db: Session, label_id: str) -> None:
+        """
+        Make sure a label row exists, without a database round trip if it is known to exist.
+        
+        Labels missing from the table are inserted with their ID as the name, the same
+        placeholder used when saving messages; sync_labels fills in the real names.
+        
+        Args:
+            db: Database session
+            label_id: Gmail label ID
+        """
+        with _known_labels_lock:
+            if label_id in _known_labels:
+                return
+        
+        LabelRepository.upsert_stub(db, label_id)
+    
+    @staticmethod
+    def upsert_stub(db: Session, label_id: str) -> None:
+        """
+        Insert a label named after its ID unless it already exists, without reading it first.
+        
+        Args:
+            db: Database session
+            label_id: Gmail label ID
+        """
+        db.execute(
+            pg_insert(Label)
+            .values(label_id=label_id, name=label_id, type='user')
+            .on_conflict_do_nothing(index_elements=[Label.label_id])
+        )
+        db.commit()
+        LabelRepository.mark_labels_known([label_id])
+    
+    @staticmethod
+    def sync_labels(db: Session, labels: List[Dict[str, Any]]) -> None:
+        """
+        Upsert the user's Gmail labels in one statement and remember them as known.
+        
+        Args:
+            db: Database session
+            labels: Label dictionaries from the Gmail API, with id, name and type keys
+        """
+        rows = list({
+            label['id']: {'label_id': label['id'], 'name': label.get('name', label['id']), 'type': label.get('type', 'user')}
+            for label in labels
+        }.values())
+        if not rows:
+            return
+        
+        stmt = pg_insert(Label).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Label.label_id],
+            set_={'name': stmt.excluded.name, 'type': stmt.excluded.type},
+        )
+        db.execute(stmt)
+        db.commit()
+        LabelRepository.mark_labels_known(row['label_id'] for row in rows)
+    
+    @staticmethod
+    def mark_labels_known(label_ids: Iterable[str]) -> None:
+        """Record label IDs that are stored in the labels table."""
+        with _known_labels_lock:
+            for label_id in label_ids:
+                _known_labels[label_id] = True
+    
     @staticmethod
     def get_label_by_id(db: Session, label_id: str) -> Optional[Label]:
         """
@@ -206,7 +400,7 @@ class LabelRepository:
         Returns:
             Label object if found, None otherwise
         """
-        return db.query(Label).filter(Label.label_id == label_id).first()
+        return db.get(Label, label_id)
     
     @staticmethod
     def get_labels(db: Session) -> List[Label]:
@@ -219,13 +413,13 @@ class LabelRepository:
         Returns:
             List of Label objects
         """
-        return db.query(Label).all()
+        return db.scalars(select(Label)).all()
 
 class ReminderRepository:
     """Repository for reminder-related database operations."""
     
     @staticmethod
-    def create_reminder(db: Session, email_id: str, reminder_data: Dict[str, Any]) -> Reminder:
+    def create_reminder(db: Session, email_id: str, reminder_data: Dict[str, Any], commit: bool = True) -> Reminder:
         """
         Create a new reminder for an email.
         
@@ -233,23 +427,61 @@ class ReminderRepository:
             db: Database session
             email_id: Gmail message ID
             reminder_data: Dictionary containing reminder data
+            commit: Commit the change; False only flushes, leaving the commit to the caller
             
         Returns:
             Reminder object
         """
-        reminder = Reminder(
-            id=str(uuid4()),
-            email_id=email_id,
-            description=reminder_data.get('description'),
-            due_date=reminder_data.get('due_date'),
-            is_completed=reminder_data.get('is_completed', False)
-        )
+        # INSERT ... RETURNING hands back the stored row without a SELECT after the commit
+        stmt = insert(Reminder).values(**ReminderRepository.reminder_row(email_id, reminder_data)).returning(Reminder)
+        reminder = db.execute(stmt).scalar_one()
         
-        db.add(reminder)
-        db.commit()
-        db.refresh(reminder)
+        _commit_or_flush(db, commit)
         return reminder
     
+    @staticmethod
+    def reminder_row(email_id: str, reminder_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Map reminder data to the column values of a reminders row.
+        
+        Args:
+            email_id: Gmail message ID
+            reminder_data: Dictionary containing reminder data
+            
+        Returns:
+            Dictionary of column values
+        """
+        # The id is generated here because existing tables have no default on it
+        return {
+            'id': str(uuid4()),
+            'email_id': email_id,
+            'description': reminder_data.get('description'),
+            'due_date': reminder_data.get('due_date'),
+            'is_completed': reminder_data.get('is_completed', False)
+        }
+    
+    @staticmethod
+    def bulk_create(db: Session, email_id: str, reminders_data: List[Dict[str, Any]], commit: bool = True) -> int:
+        """
+        Create several reminders for an email with one executemany INSERT.
+        
+        Args:
+            db: Database session
+            email_id: Gmail message ID
+            reminders_data: Dictionaries containing reminder data
+            commit: Commit the change; False only flushes, leaving the commit to the caller
+            
+        Returns:
+            Number of reminders created
+        """
+        rows = [ReminderRepository.reminder_row(email_id, reminder_data) for reminder_data in reminders_data]
+        if not rows:
+            return 0
+        
+        db.execute(insert(Reminder), rows)
+        _commit_or_flush(db, commit)
+        return len(rows)
+    
     @staticmethod
     def get_reminders_by_email(db: Session, email_id: str) -> List[Reminder]:
         """
@@ -262,13 +494,31 @@ class ReminderRepository:
         Returns:
             List of Reminder objects
         """
-        return db.query(Reminder).filter(Reminder.email_id == email_id).all()
+        return db.scalars(select(Reminder).where(Reminder.email_id == email_id)).all()
+    
+    @staticmethod
+    def get_reminders_by_emails(db: Session, email_ids: List[str]) -> Dict[str, List[Reminder]]:
+        """
+        Get the reminders of several emails with one query.
+        
+        Args:
+            db: Database session
+            email_ids: Gmail message IDs
+            
+        Returns:
+            Dictionary mapping each email ID to its Reminder objects; emails without any are absent
+        """
+        by_email = defaultdict(list)
+        if email_ids:
+            for row in db.scalars(select(Reminder).where(Reminder.email_id.in_(email_ids))):
+                by_email[row.email_id].append(row)
+        return dict(by_email)
 
 class TodoRepository:
     """Repository for todo-related database operations."""
     
     @staticmethod
-    def create_todo(db: Session, email_id: str, todo_data: Dict[str, Any]) -> Todo:
+    def create_todo(db: Session, email_id: str, todo_data: Dict[str, Any], commit: bool = True) -> Todo:
         """
         Create a new todo item for an email.
         
@@ -276,23 +526,61 @@ class TodoRepository:
             db: Database session
             email_id: Gmail message ID
             todo_data: Dictionary containing todo data
+            commit: Commit the change; False only flushes, leaving the commit to the caller
             
         Returns:
             Todo object
         """
-        todo = Todo(
-            id=str(uuid4()),
-            email_id=email_id,
-            description=todo_data.get('description'),
-            priority=todo_data.get('priority'),
-            is_completed=todo_data.get('is_completed', False)
-        )
+        # INSERT ... RETURNING hands back the stored row without a SELECT after the commit
+        stmt = insert(Todo).values(**TodoRepository.todo_row(email_id, todo_data)).returning(Todo)
+        todo = db.execute(stmt).scalar_one()
         
-        db.add(todo)
-        db.commit()
-        db.refresh(todo)
+        _commit_or_flush(db, commit)
         return todo
     
+    @staticmethod
+    def todo_row(email_id: str, todo_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Map todo data to the column values of a todos row.
+        
+        Args:
+            email_id: Gmail message ID
+            todo_data: Dictionary containing todo data
+            
+        Returns:
+            Dictionary of column values
+        """
+        # The id is generated here because existing tables have no default on it
+        return {
+            'id': str(uuid4()),
+            'email_id': email_id,
+            'description': todo_data.get('description'),
+            'priority': todo_data.get('priority'),
+            'is_completed': todo_data.get('is_completed', False)
+        }
+    
+    @staticmethod
+    def bulk_create(db: Session, email_id: str, todos_data: List[Dict[str, Any]], commit: bool = True) -> int:
+        """
+        Create several todo items for an email with one executemany INSERT.
+        
+        Args:
+            db: Database session
+            email_id: Gmail message ID
+            todos_data: Dictionaries containing todo data
+            commit: Commit the change; False only flushes, leaving the commit to the caller
+            
+        Returns:
+            Number of todo items created
+        """
+        rows = [TodoRepository.todo_row(email_id, todo_data) for todo_data in todos_data]
+        if not rows:
+            return 0
+        
+        db.execute(insert(Todo), rows)
+        _commit_or_flush(db, commit)
+        return len(rows)
+    
     @staticmethod
     def get_todos_by_email(db: Session, email_id: str) -> List[Todo]:
         """
@@ -305,13 +593,31 @@ class TodoRepository:
         Returns:
             List of Todo objects
         """
-        return db.query(Todo).filter(Todo.email_id == email_id).all()
+        return db.scalars(select(Todo).where(Todo.email_id == email_id)).all()
+    
+    @staticmethod
+    def get_todos_by_emails(db: Session, email_ids: List[str]) -> Dict[str, List[Todo]]:
+        """
+        Get the todo items of several emails with one query.
+        
+        Args:
+            db: Database session
+            email_ids: Gmail message IDs
+            
+        Returns:
+            Dictionary mapping each email ID to its Todo objects; emails without any are absent
+        """
+        by_email = defaultdict(list)
+        if email_ids:
+            for row in db.scalars(select(Todo).where(Todo.email_id.in_(email_ids))):
+                by_email[row.email_id].append(row)
+        return dict(by_email)
 
 class FinanceRepository:
     """Repository for finance-related database operations."""
     
     @staticmethod
-    def create_finance_data(db: Session, email_id: str, finance_data: Dict[str, Any]) -> FinanceData:
+    def create_finance_data(db: Session, email_id: str, finance_data: Dict[str, Any], commit: bool = True) -> FinanceData:
         """
         Create a new finance record for an email.
         
@@ -319,11 +625,13 @@ class FinanceRepository:
             db: Database session
             email_id: Gmail message ID
             finance_data: Dictionary containing finance data
+            commit: Commit the change; False only flushes, leaving the commit to the caller
             
         Returns:
             FinanceData object
         """
-        finance = FinanceData(
+        # INSERT ... RETURNING hands back the stored row without a SELECT after the commit
+        stmt = insert(FinanceData).values(
             id=str(uuid4()),
             email_id=email_id,
             amount=finance_data.get('amount'),
@@ -332,12 +640,11 @@ class FinanceRepository:
             transaction_type=finance_data.get('transaction_type'),
             category=finance_data.get('category'),
             due_date=finance_data.get('due_date'),
-            details=finance_data.get('details', {})
-        )
+            details=finance_data.get('details') or None
+        ).returning(FinanceData)
+        finance = db.execute(stmt).scalar_one()
         
-        db.add(finance)
-        db.commit()
-        db.refresh(finance)
+        _commit_or_flush(db, commit)
         return finance
     
     @staticmethod
@@ -352,4 +659,109 @@ class FinanceRepository:
         Returns:
             List of FinanceData objects
         """
-        return db.query(FinanceData).filter(FinanceData.email_id == email_id).all()
+        return db.scalars(select(FinanceData).where(FinanceData.email_id == email_id)).all()
+    
+    @staticmethod
+    def get_finance_data_by_emails(db: Session, email_ids: List[str]) -> Dict[str, List[FinanceData]]:
+        """
+        Get the finance records of several emails with one query.
+        
+        Args:
+            db: Database session
+            email_ids: Gmail message IDs
+            
+        Returns:
+            Dictionary mapping each email ID to its FinanceData objects; emails without any are absent
+        """
+        by_email = defaultdict(list)
+        if email_ids:
+            for row in db.scalars(select(FinanceData).where(FinanceData.email_id.in_(email_ids))):
+                by_email[row.email_id].append(row)
+        return dict(by_email)
+
+class AgentResultRepository:
+    """Repository for cached agent results."""
+    
+    @staticmethod
+    def get_results(db: Session, message_ids: List[str], agent_names: List[str]) -> Dict[Tuple[str, str], Any]:
+        """
+        Get cached results for a set of messages and agents in a single query.
+        
+        Args:
+            db: Database session
+            message_ids: Gmail message IDs
+            agent_names: Names of the agents whose results to load
+            
+        Returns:
+            Dictionary of results keyed by (message_id, agent_name); empty if the
+            agent_results table is missing
+        """
+        if not message_ids or not agent_names:
+            return {}
+        
+        try:
+            rows = db.scalars(select(AgentResult).where(
+                AgentResult.message_id.in_(message_ids),
+                AgentResult.agent_name.in_(agent_names)
+            )).all()
+        except ProgrammingError as e:
+            # The cache is an optimization; without its table every result is computed
+            db.rollback()
+            logger.error(f"Error reading cached agent results: {str(e)}")
+            return {}
+        return {(row.message_id, row.agent_name): row.result for row in rows}
+    
+    @staticmethod
+    def save_results(db: Session, results: List[Dict[str, Any]]) -> None:
+        """
+        Store agent results, keeping any result that is already cached.
+        
+        Results are not stored, and no error is raised, if the agent_results table is missing.
+        
+        Args:
+            db: Database session
+            results: Dictionaries with message_id, agent_name and result keys
+        """
+        if not results:
+            return
+        
+        # Concurrent batches may cache the same result; the first write wins
+        stmt = pg_insert(AgentResult).values(results).on_conflict_do_nothing(
+            index_elements=[AgentResult.message_id, AgentResult.agent_name]
+        )
+        try:
+            db.execute(stmt)
+            db.commit()
+        except ProgrammingError as e:
+            db.rollback()
+            logger.error(f"Error caching agent results: {str(e)}")
+
+class FailedGmailOpRepository:
+    """Repository for Gmail label changes that could not be applied."""
+    
+    @staticmethod
+    def record_failure(db: Session, message_id: str, operation: str, label_id: str, error: Optional[str] = None) -> FailedGmailOp:
+        """
+        Record a Gmail label change that failed, so it can be retried.
+        
+        Args:
+            db: Database session
+            message_id: Gmail message ID
+            operation: add_label or remove_label
+            label_id: Gmail label ID
+            error: Description of the failure
+            
+        Returns:
+            FailedGmailOp object
+        """
+        failed_op = FailedGmailOp(
+            id=str(uuid4()),
+            message_id=message_id,
+            operation=operation,
+            label_id=label_id,
+            error=error
+        )
+        
+        db.add(failed_op)
+        db.commit()
+        return failed_op
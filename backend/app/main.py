@@ -1,8 +1,70 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
+from dotenv import load_dotenv
+
+# Load .env once per process; settings and the Google auth helpers read from the environment
+load_dotenv()
+
+# Configure logging once for the whole application, before the app modules are imported
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
 from fastapi import FastAPI
 from app.core.config import setup
+from app.core.responses import FastJSONResponse
 from app.api.router import router
+from app.api.deps import get_gmail_client
+from app.db.database import SessionLocal, create_missing_tables
+from app.db.repositories import LabelRepository
+from app.models import AgentResult, FailedGmailOp
+
+logger = logging.getLogger(__name__)
+
+# Tables added after the original schema, created on startup in databases that lack them
+NEW_TABLES = [AgentResult.__table__, FailedGmailOp.__table__]
+
+# How often the background task checks whether the Gmail credentials need a refresh
+CREDENTIALS_CHECK_INTERVAL = 60
+
+async def refresh_gmail_credentials(gmail_client):
+    """Keep the shared Gmail credentials fresh so requests never refresh them inline."""
+    while True:
+        await asyncio.sleep(CREDENTIALS_CHECK_INTERVAL)
+        try:
+            await asyncio.to_thread(gmail_client.refresh_credentials)
+        except Exception as e:
+            logger.warning(f"Background Gmail credential refresh failed: {e}")
+
+def sync_labels(labels):
+    """Store the Gmail labels in the database using a short-lived session."""
+    db = SessionLocal()
+    try:
+        LabelRepository.sync_labels(db, labels)
+    finally:
+        db.close()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    try:
+        await asyncio.to_thread(create_missing_tables, NEW_TABLES)
+    except Exception as e:
+        logger.warning(f"Creating missing tables failed: {e}")
+    # Load the credentials and build the Gmail service once, before the first request
+    gmail_client = get_gmail_client()
+    if await asyncio.to_thread(gmail_client.authenticate):
+        # One cheap call opens the TLS connection and validates the access token up front
+        # and seeds the label table and cache, so saving messages skips per-label queries
+        try:
+            labels = await asyncio.to_thread(gmail_client.get_labels)
+            await asyncio.to_thread(sync_labels, labels)
+        except Exception as e:
+            logger.warning(f"Gmail warm-up or label sync failed: {e}")
+    task = asyncio.create_task(refresh_gmail_credentials(gmail_client))
+    yield
+    task.cancel()
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
 setup(app)
 app.include_router(router)
 
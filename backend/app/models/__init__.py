@@ -1,4 +1,4 @@
-from app.models.email import Email, Label, Reminder, Todo, FinanceData
+from app.models.email import Email, Label, Reminder, Todo, FinanceData, AgentResult, FailedGmailOp
 
 # Export all models
-__all__ = ['Email', 'Label', 'Reminder', 'Todo', 'FinanceData']
+__all__ = ['Email', 'Label', 'Reminder', 'Todo', 'FinanceData', 'AgentResult', 'FailedGmailOp']
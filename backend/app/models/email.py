@@ -1,16 +1,24 @@
-from sqlalchemy import Column, String, DateTime, Text, Boolean, ForeignKey, Table
+from uuid import uuid4
+from sqlalchemy import Column, String, DateTime, Text, Boolean, ForeignKey, Table, Index, JSON, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from sqlalchemy.dialects.postgresql import JSONB
 
 from app.db.database import Base
 
+def _new_id() -> str:
+    # Client-side id for tables created before the gen_random_uuid() server default existed
+    return str(uuid4())
+
 # Association table for many-to-many relationship between emails and labels
 email_label_association = Table(
     'email_label_association',
     Base.metadata,
-    Column('email_id', String, ForeignKey('emails.message_id')),
-    Column('label_id', String, ForeignKey('labels.label_id'))
+    # The composite primary key keeps each pair unique and indexes lookups by email
+    Column('email_id', String, ForeignKey('emails.message_id'), primary_key=True),
+    Column('label_id', String, ForeignKey('labels.label_id'), primary_key=True),
+    # The primary key only serves lookups by email; this one serves lookups by label
+    Index('ix_ela_label', 'label_id')
 )
 
 class Email(Base):
@@ -27,14 +35,18 @@ class Email(Base):
     is_read = Column(Boolean, default=False)
     has_attachments = Column(Boolean, default=False)
     
-    # Store additional metadata as JSON
-    email_metadata = Column(JSONB, nullable=True)
+    # Store additional metadata as JSON; plain JSON since it is never queried into, only read back
+    email_metadata = Column(JSON, nullable=True)
     
-    # Relationships
-    labels = relationship("Label", secondary=email_label_association, back_populates="emails")
-    reminders = relationship("Reminder", back_populates="email")
-    todos = relationship("Todo", back_populates="email")
-    finance_data = relationship("FinanceData", back_populates="email")
+    # Relationships; queries load the ones they need eagerly, so lazy loads raise instead of
+    # silently issuing one query per email
+    labels = relationship("Label", secondary=email_label_association, back_populates="emails", lazy="raise")
+    reminders = relationship("Reminder", back_populates="email", lazy="raise")
+    todos = relationship("Todo", back_populates="email", lazy="raise")
+    finance_data = relationship("FinanceData", back_populates="email", lazy="raise")
+
+# Serves the newest-first pagination in get_emails without a sort
+Index('ix_emails_date_desc', Email.date_received.desc())
 
 class Label(Base):
     """Model for storing Gmail labels."""
@@ -51,8 +63,8 @@ class Reminder(Base):
     """Model for storing reminders extracted from emails."""
     __tablename__ = "reminders"
 
-    id = Column(String, primary_key=True)
-    email_id = Column(String, ForeignKey("emails.message_id"))
+    id = Column(String, primary_key=True, default=_new_id, server_default=text("gen_random_uuid()::text"))
+    email_id = Column(String, ForeignKey("emails.message_id"), index=True)
     description = Column(Text, nullable=False)
     due_date = Column(DateTime, nullable=True)
     is_completed = Column(Boolean, default=False)
@@ -65,8 +77,8 @@ class Todo(Base):
     """Model for storing todo items extracted from emails."""
     __tablename__ = "todos"
 
-    id = Column(String, primary_key=True)
-    email_id = Column(String, ForeignKey("emails.message_id"))
+    id = Column(String, primary_key=True, default=_new_id, server_default=text("gen_random_uuid()::text"))
+    email_id = Column(String, ForeignKey("emails.message_id"), index=True)
     description = Column(Text, nullable=False)
     priority = Column(String, nullable=True)  # high, medium, low
     is_completed = Column(Boolean, default=False)
@@ -79,15 +91,35 @@ class FinanceData(Base):
     """Model for storing financial information extracted from emails."""
     __tablename__ = "finance_data"
 
-    id = Column(String, primary_key=True)
-    email_id = Column(String, ForeignKey("emails.message_id"))
+    id = Column(String, primary_key=True, default=_new_id, server_default=text("gen_random_uuid()::text"))
+    email_id = Column(String, ForeignKey("emails.message_id"), index=True)
     amount = Column(String, nullable=True)
     currency = Column(String, nullable=True)
     transaction_purpose = Column(String, nullable=True)  # purchase, refund, payment, bill, statement, etc.
     transaction_type = Column(String, nullable=True)  # credit or debit
     category = Column(String, nullable=True)  # spending category (dining, travel, utilities, etc.)
     due_date = Column(DateTime, nullable=True)
-    details = Column(JSONB, nullable=True)  # Additional extracted financial details
+    details = Column(JSON, nullable=True)  # Additional extracted financial details
     
     # Relationships
     email = relationship("Email", back_populates="finance_data")
+
+class AgentResult(Base):
+    """Model for caching agent output per email, so reprocessing a message skips the LLM call."""
+    __tablename__ = "agent_results"
+
+    message_id = Column(String, primary_key=True)
+    agent_name = Column(String, primary_key=True)  # summary, finance, todos, reminders, unified
+    result = Column(JSONB, nullable=False)
+    created_at = Column(DateTime, server_default=func.now())
+
+class FailedGmailOp(Base):
+    """Model for Gmail label changes that failed in the background, kept for retry."""
+    __tablename__ = "failed_gmail_ops"
+
+    id = Column(String, primary_key=True, default=_new_id, server_default=text("gen_random_uuid()::text"))
+    message_id = Column(String, index=True)
+    operation = Column(String, nullable=False)  # add_label or remove_label
+    label_id = Column(String, nullable=False)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, server_default=func.now())
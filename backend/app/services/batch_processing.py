@@ -1,5 +1,6 @@
 # backend/app/services/batch_processing.py
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
+import asyncio
 import logging
 from datetime import datetime
 from sqlalchemy.orm import Session
@@ -9,25 +10,48 @@ from app.agents.summarizer import SummarizerAgent
 from app.agents.finance_agent import FinanceAgent
 from app.agents.todo_agent import TodoAgent
 from app.agents.reminder_agent import ReminderAgent
-from app.db.repositories import EmailRepository, LabelRepository, ReminderRepository, TodoRepository, FinanceRepository
+from app.db.repositories import EmailRepository, ReminderRepository, TodoRepository, FinanceRepository
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Messages fetched per batched Gmail request while streaming a batch
+FETCH_CHUNK_SIZE = 20
+# Bound on messages waiting between the fetch, extraction and storage stages
+QUEUE_SIZE = 32
+
 class BatchProcessor:
     """Service for batch processing emails through various agents and storing results in the database."""
     
-    def __init__(self):
-        self.gmail_client = GmailClient()
-        self.summarizer = SummarizerAgent()
-        self.finance_agent = FinanceAgent()
-        self.todo_agent = TodoAgent()
-        self.reminder_agent = ReminderAgent()
+    def __init__(
+        self,
+        gmail_client: Optional[GmailClient] = None,
+        summarizer: Optional[SummarizerAgent] = None,
+        finance_agent: Optional[FinanceAgent] = None,
+        todo_agent: Optional[TodoAgent] = None,
+        reminder_agent: Optional[ReminderAgent] = None,
+        max_concurrency: int = 8,
+    ):
+        # Reuse the given clients and agents; agents built here share one Gmail client.
+        # Sharing agents between workers is safe because each of their calls
+        # builds its own agno Agent, so no run state is shared.
+        self.gmail_client = gmail_client or GmailClient()
+        self.summarizer = summarizer or SummarizerAgent(gmail_client=self.gmail_client)
+        self.finance_agent = finance_agent or FinanceAgent(gmail_client=self.gmail_client)
+        self.todo_agent = todo_agent or TodoAgent(gmail_client=self.gmail_client)
+        self.reminder_agent = reminder_agent or ReminderAgent(gmail_client=self.gmail_client)
+        # Upper bound on emails whose agents run at once, to stay within the Gemini rate limits
+        self.max_concurrency = max_concurrency
     
-    def process_recent_emails(self, db: Session, max_emails: int = 10, query: str = "") -> Dict[str, Any]:
+    async def process_recent_emails(self, db: Session, max_emails: int = 10, query: str = "") -> Dict[str, Any]:
         """Process the most recent emails and store results in the database.
         
+        Emails stream through three stages joined by bounded queues: messages
+        are fetched from Gmail in chunks, up to max_concurrency emails run
+        their reminder, todo and finance agents concurrently, and a single
+        writer stores each email as soon as its agents finish. Only a few
+        queues' worth of messages are held in memory, and downloads, Gemini
+        calls and database writes overlap. The batch is committed once.
+        
         Args:
             db: Database session
             max_emails: Maximum number of emails to process
@@ -39,10 +63,12 @@ class BatchProcessor:
         start_time = datetime.now()
         logger.info(f"Starting batch processing of up to {max_emails} emails")
         
-        # Get recent emails
+        # List the recent emails; their contents are fetched while the batch is processed
         try:
-            emails = self.gmail_client.get_messages(max_results=max_emails, query=query)
-            logger.info(f"Retrieved {len(emails)} emails from Gmail")
+            message_ids = await asyncio.to_thread(
+                self.gmail_client.list_message_ids, max_results=max_emails, query=query
+            )
+            logger.info(f"Found {len(message_ids)} emails in Gmail")
         except Exception as e:
             logger.error(f"Error retrieving emails: {str(e)}")
             return {
@@ -54,7 +80,7 @@ class BatchProcessor:
         
         # Process statistics
         stats = {
-            "total_emails": len(emails),
+            "total_emails": len(message_ids),
             "emails_processed": 0,
             "emails_failed": 0,
             "reminders_extracted": 0,
@@ -63,18 +89,18 @@ class BatchProcessor:
             "failed_emails": []
         }
         
-        # Process each email
-        for email in emails:
-            try:
-                self._process_single_email(db, email, stats)
-                stats["emails_processed"] += 1
-            except Exception as e:
-                logger.error(f"Error processing email {email.get('id')}: {str(e)}")
-                stats["emails_failed"] += 1
-                stats["failed_emails"].append({
-                    "email_id": email.get('id'),
-                    "error": str(e)
-                })
+        fetched = asyncio.Queue(maxsize=QUEUE_SIZE)
+        extracted = asyncio.Queue(maxsize=QUEUE_SIZE)
+        workers = min(self.max_concurrency, len(message_ids)) or 1
+        async with asyncio.TaskGroup() as group:
+            fetch_task = group.create_task(self._fetch_emails(message_ids, fetched, workers))
+            for _ in range(workers):
+                group.create_task(self._extract_emails(fetched, extracted))
+            group.create_task(self._store_emails(db, extracted, workers, stats))
+        
+        for failure in fetch_task.result():
+            stats["emails_failed"] += 1
+            stats["failed_emails"].append(failure)
         
         # Calculate duration
         end_time = datetime.now()
@@ -95,76 +121,226 @@ class BatchProcessor:
         
         return result
     
-    def _process_single_email(self, db: Session, email: Dict[str, Any], stats: Dict[str, Any]) -> None:
-        """Process a single email through all agents and store results.
+    async def _fetch_emails(self, message_ids: List[str], fetched: asyncio.Queue, workers: int) -> List[Dict[str, Any]]:
+        """Fetch the emails chunk by chunk and queue them for extraction.
+        
+        Args:
+            message_ids: IDs of the emails to fetch, most recent first
+            fetched: Queue the fetched messages are put on
+            workers: Number of extraction workers, each sent a None when fetching is done
+            
+        Returns:
+            Failure entries for the emails that could not be fetched
+        """
+        failures = []
+        for start in range(0, len(message_ids), FETCH_CHUNK_SIZE):
+            chunk = message_ids[start:start + FETCH_CHUNK_SIZE]
+            try:
+                messages = await asyncio.to_thread(self.gmail_client.batch_get_messages, chunk, format='full')
+            except Exception as e:
+                logger.error(f"Error retrieving emails: {str(e)}")
+                failures.extend({"email_id": message_id, "error": str(e)} for message_id in chunk)
+                continue
+            for message_id in chunk:
+                if message_id in messages:
+                    await fetched.put(messages[message_id])
+                else:
+                    failures.append({"email_id": message_id, "error": "Message could not be retrieved from Gmail"})
+        
+        for _ in range(workers):
+            await fetched.put(None)
+        return failures
+    
+    async def _extract_emails(self, fetched: asyncio.Queue, extracted: asyncio.Queue) -> None:
+        """Run the agents on queued emails until a None arrives, passing the results on.
+        
+        Args:
+            fetched: Queue of fetched messages
+            extracted: Queue the (email, results) pairs are put on, followed by a None
+        """
+        while (email := await fetched.get()) is not None:
+            await extracted.put((email, await self._run_agents(email)))
+        await extracted.put(None)
+    
+    async def _store_emails(self, db: Session, extracted: asyncio.Queue, workers: int, stats: Dict[str, Any]) -> None:
+        """Store emails as their results arrive, then commit the batch once.
         
         Args:
             db: Database session
-            email: Email data from Gmail API
+            extracted: Queue of (email, results) pairs, with one None per extraction worker
+            workers: Number of extraction workers
             stats: Statistics dictionary to update
         """
+        known_labels = set()
+        assocs = []
+        while workers:
+            item = await extracted.get()
+            if item is None:
+                workers -= 1
+                continue
+            email, results = item
+            await asyncio.to_thread(self._store_email, db, email, results, stats, known_labels, assocs)
+        
+        await asyncio.to_thread(self._commit_batch, db, assocs)
+    
+    async def _run_agents(self, email: Dict[str, Any]) -> Dict[str, Any]:
+        """Run the reminder, todo and finance agents on one email concurrently.
+        
+        Up to max_concurrency workers call this at once on the same agents; each
+        agent call runs on its own agno Agent, so results stay with their email.
+        
+        Args:
+            email: Processed message, including its body
+            
+        Returns:
+            Dictionary with "reminders", "todos" and "finance" results; an agent
+            that failed has None
+        """
         email_id = email.get('id')
-        logger.info(f"Processing email {email_id}")
+        names = ("reminders", "todos", "finance")
+        outcomes = await asyncio.gather(
+            self.reminder_agent.arun_with_body(email_id, email),
+            self.todo_agent.arun_with_body(email_id, email),
+            self.finance_agent.arun_with_body(email_id, email),
+            return_exceptions=True
+        )
         
-        # Save email to database
-        db_email = EmailRepository.create_or_update_email(db, email)
-        
-        # Save labels
-        if 'labelIds' in email:
-            for label_id in email['labelIds']:
-                # Create or update label
-                label_data = {'id': label_id, 'name': label_id}  # Basic label data
-                LabelRepository.create_or_update_label(db, label_data)
-                
-                # Associate label with email
-                EmailRepository.add_label_to_email(db, email_id, label_id)
-        
-        # Process with reminder agent
-        try:
-            reminders_data = self.reminder_agent.run(email_id)
-            if reminders_data and isinstance(reminders_data, dict) and "reminders" in reminders_data:
-                for reminder in reminders_data["reminders"]:
-                    if reminder and isinstance(reminder, dict) and "title" in reminder:
-                        # Convert to the format expected by the repository
-                        reminder_item = {
-                            "description": reminder.get("title", ""),
-                            "due_date": reminder.get("date"),
-                            "is_completed": False
-                        }
-                        ReminderRepository.create_reminder(db, email_id, reminder_item)
-                        stats["reminders_extracted"] += 1
-        except Exception as e:
-            logger.warning(f"Error extracting reminders from email {email_id}: {str(e)}")
+        results = {}
+        for name, outcome in zip(names, outcomes):
+            if isinstance(outcome, Exception):
+                logger.warning(f"Error extracting {name} from email {email_id}: {str(outcome)}")
+                outcome = None
+            results[name] = outcome
+        return results
+    
+    def _store_email(
+        self,
+        db: Session,
+        email: Dict[str, Any],
+        results: Dict[str, Any],
+        stats: Dict[str, Any],
+        known_labels: set,
+        assocs: List[Dict[str, str]],
+    ) -> None:
+        """Store one email with its labels and agent results, without committing.
+        
+        Args:
+            db: Database session
+            email: Processed message
+            results: Agent results, as returned by _run_agents
+            stats: Statistics dictionary to update
+            known_labels: IDs of the labels already written in this batch
+            assocs: Label associations to write at commit time, extended for a stored email
+        """
+        label_ids = email.get('label_ids', [])
+        # Labels new to the batch are written once, outside the email's savepoint
+        new_labels = [label_id for label_id in dict.fromkeys(label_ids) if label_id not in known_labels]
+        if new_labels:
+            EmailRepository.bulk_upsert(
+                db, [], [{'label_id': label_id, 'name': label_id, 'type': 'user'} for label_id in new_labels], [], commit=False
+            )
+            known_labels.update(new_labels)
         
-        # Process with todo agent
+        # Store the email in a savepoint of its own, so a failing email is rolled
+        # back without losing the others
         try:
-            todos_data = self.todo_agent.run(email_id)
-            if todos_data and isinstance(todos_data, dict) and "todos" in todos_data:
-                for todo in todos_data["todos"]:
-                    if todo and isinstance(todo, dict) and "task" in todo:
-                        # Convert to the format expected by the repository
-                        todo_item = {
-                            "description": todo.get("task", ""),
-                            "priority": todo.get("priority", "medium"),
-                            "is_completed": False
-                        }
-                        TodoRepository.create_todo(db, email_id, todo_item)
-                        stats["todos_extracted"] += 1
+            with db.begin_nested():
+                reminder_count, todo_count, finance_count = self._process_single_email(db, email, results)
+            # Counted only once the savepoint is released, so a rolled back email adds nothing
+            stats["emails_processed"] += 1
+            stats["reminders_extracted"] += reminder_count
+            stats["todos_extracted"] += todo_count
+            stats["finance_data_extracted"] += finance_count
+            assocs.extend({'email_id': email['id'], 'label_id': label_id} for label_id in label_ids)
         except Exception as e:
-            logger.warning(f"Error extracting todos from email {email_id}: {str(e)}")
+            logger.error(f"Error processing email {email.get('id')}: {str(e)}")
+            stats["emails_failed"] += 1
+            stats["failed_emails"].append({
+                "email_id": email.get('id'),
+                "error": str(e)
+            })
+    
+    def _commit_batch(self, db: Session, assocs: List[Dict[str, str]]) -> None:
+        """Write the label associations of the stored emails and commit the batch.
         
-        # Process with finance agent
+        Args:
+            db: Database session
+            assocs: Association rows with email_id and label_id keys
+        """
         try:
-            finance_data = self.finance_agent.run(email_id)
-            if finance_data and isinstance(finance_data, dict) and "error" not in finance_data:
-                # Finance agent returns a single object, not a list
-                if any(key in finance_data for key in ["amount", "transaction_purpose", "transaction_type", "merchant"]):
-                    FinanceRepository.create_finance_data(db, email_id, finance_data)
-                    stats["finance_data_extracted"] += 1
+            # Label associations of the stored emails, in one INSERT
+            EmailRepository.bulk_upsert(db, [], [], assocs, commit=False)
+            db.commit()
         except Exception as e:
-            logger.warning(f"Error extracting finance data from email {email_id}: {str(e)}")
+            db.rollback()
+            logger.error(f"Error committing batch: {str(e)}")
+            raise
+    
+    def _process_single_email(
+        self,
+        db: Session,
+        email: Dict[str, Any],
+        results: Dict[str, Any],
+    ) -> Tuple[int, int, int]:
+        """Store a single email and the results its agents extracted.
+        
+        Rows are only flushed; the caller commits.
+        
+        Args:
+            db: Database session
+            email: Email data from Gmail API
+            results: Agent results, as returned by _run_agents
+            
+        Returns:
+            Tuple of (reminders, todos, finance records) stored
+        """
+        reminder_count = todo_count = finance_count = 0
+        email_id = email.get('id')
+        logger.info(f"Processing email {email_id}")
+        
+        # Save email to database
+        db_email = EmailRepository.create_or_update_email(db, email, commit=False)
+        
+        # Store reminders, all of an email's in one INSERT
+        reminders_data = results.get("reminders")
+        if reminders_data and isinstance(reminders_data, dict) and "reminders" in reminders_data:
+            # Convert to the format expected by the repository
+            reminder_items = [
+                {
+                    "description": reminder.get("title", ""),
+                    "due_date": reminder.get("date"),
+                    "is_completed": False
+                }
+                for reminder in reminders_data["reminders"]
+                if reminder and isinstance(reminder, dict) and "title" in reminder
+            ]
+            reminder_count = ReminderRepository.bulk_create(db, email_id, reminder_items, commit=False)
+        
+        # Store todos, all of an email's in one INSERT
+        todos_data = results.get("todos")
+        if todos_data and isinstance(todos_data, dict) and "todos" in todos_data:
+            # Convert to the format expected by the repository
+            todo_items = [
+                {
+                    "description": todo.get("task", ""),
+                    "priority": todo.get("priority", "medium"),
+                    "is_completed": False
+                }
+                for todo in todos_data["todos"]
+                if todo and isinstance(todo, dict) and "task" in todo
+            ]
+            todo_count = TodoRepository.bulk_create(db, email_id, todo_items, commit=False)
+        
+        # Store finance data
+        finance_data = results.get("finance")
+        if finance_data and isinstance(finance_data, dict) and "error" not in finance_data:
+            # Finance agent returns a single object, not a list
+            if any(finance_data.get(key) for key in ["amount", "transaction_purpose", "transaction_type", "merchant"]):
+                FinanceRepository.create_finance_data(db, email_id, finance_data, commit=False)
+                finance_count = 1
         
         logger.info(f"Completed processing email {email_id}")
+        return reminder_count, todo_count, finance_count
 
 # Create a singleton instance
 batch_processor = BatchProcessor()
\ No newline at end of file
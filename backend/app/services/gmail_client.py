@@ -6,14 +6,26 @@ to use without dealing with the underlying API complexities.
 """
 import os
 import base64
-from typing import Dict, List, Optional, Any, Tuple
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+from typing import Dict, List, Optional, Any, Tuple, Literal, Iterator
+from email.header import Header
+from email.utils import formataddr, getaddresses
+from uuid import uuid4
 import logging
+import threading
+from functools import wraps
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 from pathlib import Path
+from cachetools import TTLCache
 from google.oauth2.credentials import Credentials
+import httplib2
+from google_auth_httplib2 import AuthorizedHttp
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpRequest
+from googleapiclient.model import JsonModel
+from pydantic_core import from_json
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
 
@@ -21,6 +33,69 @@ from app.core.auth import load_token, refresh_access_token, save_token, SCOPES
 
 logger = logging.getLogger(__name__)
 
+# pybase64's SIMD decoder is used for message bodies when installed; the stdlib one otherwise
+try:
+    from pybase64 import urlsafe_b64decode
+except ImportError:
+    from base64 import urlsafe_b64decode
+
+# Maximum number of sub-requests Gmail accepts in a single batch request
+GMAIL_BATCH_LIMIT = 100
+# Maximum number of message IDs Gmail returns from a single messages.list call
+GMAIL_LIST_PAGE_LIMIT = 500
+# Maximum number of message IDs accepted by a single messages.batchModify call
+GMAIL_BATCH_MODIFY_LIMIT = 1000
+# Worker threads for concurrent single requests: fallback fetches, page prefetches and sends
+GMAIL_WORKER_THREADS = 10
+
+# Processed messages are kept in memory for a few minutes, so agents working on
+# the same message do not fetch it again
+MESSAGE_CACHE_SIZE = 1024
+MESSAGE_CACHE_TTL = 300
+# Labels rarely change, so the label list is reused for a few minutes
+LABEL_CACHE_TTL = 300
+
+# Headers and fields requested for metadata-only fetches, enough to list and store messages
+METADATA_HEADERS = ['From', 'To', 'Subject', 'Date']
+METADATA_FIELDS = 'id,threadId,historyId,labelIds,snippet,internalDate,payload/headers'
+
+# System label Gmail puts on unread messages; its absence means the message is read
+UNREAD_LABEL = 'UNREAD'
+
+# Bodies decoding to more than this are not decoded; the snippet stands in when no body is left
+MAX_DECODE_BYTES = 1024 * 1024
+
+# Headers kept on processed messages, lowercased; the rest (Received, DKIM, ...) are dropped
+KEPT_HEADERS = frozenset({'subject', 'from', 'to', 'cc', 'date', 'reply-to', 'message-id'})
+
+# Credentials expiring within this window are refreshed ahead of time
+CREDENTIALS_REFRESH_MARGIN = timedelta(minutes=5)
+
+def _requires_auth(method):
+    """Authenticate the client on first use, or after a 401; later calls only check that the service is usable."""
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self.service is None or self._service_stale:
+            with self._service_lock:
+                # Another thread may have rebuilt the service while this one waited
+                if (self.service is None or self._service_stale) and not self.authenticate():
+                    raise Exception("Failed to authenticate with Gmail")
+        return method(self, *args, **kwargs)
+    return wrapper
+
+class _FastJsonModel(JsonModel):
+    """JsonModel that decodes Gmail responses with pydantic-core's Rust JSON parser."""
+    
+    def deserialize(self, content):
+        try:
+            body = from_json(content)
+        except ValueError:
+            # Not JSON; let the stock model return the raw content
+            return super().deserialize(content)
+        if self._data_wrapper and isinstance(body, dict) and 'data' in body:
+            body = body['data']
+        return body
+
 class GmailClient:
     """
     Client for interacting with Gmail API.
@@ -32,7 +107,22 @@ class GmailClient:
     def __init__(self):
         """Initialize the Gmail client."""
         self.service = None
+        # Set after a 401; the service stays usable for requests already running
+        # and is rebuilt, once, by the next call
+        self._service_stale = False
+        self._service_lock = threading.Lock()
         self.user_id = 'me'  # Default user ID for Gmail API
+        self._credentials = None
+        self._credentials_lock = threading.Lock()
+        # httplib2.Http is not thread-safe, so each worker thread gets its own
+        # authorized connection, kept alive across that thread's requests
+        self._thread_local = threading.local()
+        self._message_cache = TTLCache(maxsize=MESSAGE_CACHE_SIZE, ttl=MESSAGE_CACHE_TTL)
+        self._message_cache_lock = threading.Lock()
+        self._label_cache = TTLCache(maxsize=4, ttl=LABEL_CACHE_TTL)
+        self._label_cache_lock = threading.Lock()
+        # Long-lived, so the workers' per-thread connections stay open between calls
+        self._executor = ThreadPoolExecutor(max_workers=GMAIL_WORKER_THREADS, thread_name_prefix='gmail')
     
     def authenticate(self) -> bool:
         """
@@ -58,97 +148,404 @@ class GmailClient:
                 token_data.update(new_token_data)
                 save_token(token_data)
             
-            self.service = build('gmail', 'v1', credentials=creds)
+            self._credentials = creds
+            self._thread_local = threading.local()
+            # Build the service once from the bundled discovery document; requests
+            # are bound to a per-thread connection by _build_request
+            self.service = build(
+                'gmail', 'v1',
+                credentials=creds,
+                static_discovery=True,
+                cache_discovery=False,
+                requestBuilder=self._build_request,
+                # Message payloads, batched ones included, are parsed by pydantic-core instead of json.loads
+                model=_FastJsonModel(data_wrapper=False)
+            )
+            self._service_stale = False
             return True
         except Exception as e:
             logger.error(f"Authentication failed: {e}")
             return False
     
-    def get_messages(self, max_results: int = 10, query: str = "") -> List[Dict]:
+    def refresh_credentials(self) -> bool:
+        """
+        Refresh the shared credentials if they expire within CREDENTIALS_REFRESH_MARGIN.
+        
+        Meant to be called periodically from a background task, so request
+        handlers find valid credentials instead of refreshing them inline.
+        
+        Returns:
+            bool: True if the credentials were refreshed, False otherwise.
+        """
+        with self._credentials_lock:
+            creds = self._credentials
+            if not creds or not creds.refresh_token:
+                return False
+            # google-auth records expiry as naive UTC
+            if creds.expiry and creds.expiry - datetime.utcnow() > CREDENTIALS_REFRESH_MARGIN:
+                return False
+            
+            creds.refresh(Request())
+            token_data = load_token() or {}
+            token_data['access_token'] = creds.token
+            token_data['expiry'] = creds.expiry.isoformat() if creds.expiry else None
+            save_token(token_data)
+            logger.info("Refreshed Gmail credentials")
+            return True
+    
+    def _invalidate_on_unauthorized(self, error: HttpError) -> None:
+        """Mark the service stale after a 401, so the next call authenticates again from the stored token."""
+        if error.resp.status == 401:
+            logger.warning("Gmail rejected the credentials; the service will be rebuilt on the next call")
+            self._service_stale = True
+    
+    def _thread_http(self) -> AuthorizedHttp:
+        """Return the calling thread's authorized HTTP connection, creating it on first use."""
+        http = getattr(self._thread_local, 'http', None)
+        if http is None:
+            http = AuthorizedHttp(self._credentials, http=httplib2.Http())
+            self._thread_local.http = http
+        return http
+    
+    def _build_request(self, http, *args, **kwargs) -> HttpRequest:
+        """Request builder that sends each Gmail request over the calling thread's connection."""
+        return HttpRequest(self._thread_http(), *args, **kwargs)
+    
+    @_requires_auth
+    def get_messages(self, max_results: int = 10, query: str = "", format: str = 'metadata') -> List[Dict]:
         """
         Get messages from Gmail.
         
         Args:
-            max_results: Maximum number of messages to return
+            max_results: Maximum number of messages to return; more than
+                GMAIL_LIST_PAGE_LIMIT are read page by page
             query: Gmail search query
+            format: 'metadata' fetches only headers, labels and snippet; 'full' includes the bodies
             
         Returns:
             List of message dictionaries
         """
-        if not self.service:
-            if not self.authenticate():
-                raise Exception("Failed to authenticate with Gmail")
-        
         try:
-            # Get message IDs
-            results = self.service.users().messages().list(
-                userId=self.user_id, 
-                maxResults=max_results,
-                q=query
-            ).execute()
+            if max_results > GMAIL_LIST_PAGE_LIMIT:
+                # One list call returns at most a page of IDs
+                pages = -(-max_results // GMAIL_LIST_PAGE_LIMIT)
+                messages = self.get_messages_paginated(
+                    max_pages=pages, page_size=GMAIL_LIST_PAGE_LIMIT, query=query, format=format
+                )
+                return list(islice(messages, max_results))
             
-            messages = results.get('messages', [])
-            
-            # Get full message data for each ID
-            full_messages = []
-            for msg in messages:
-                msg_data = self.get_message(msg['id'])
-                if msg_data:
-                    full_messages.append(msg_data)
+            # Get message IDs
+            message_ids = self.list_message_ids(max_results=max_results, query=query)
             
-            return full_messages
+            # Get message data with batched requests, keeping the listing order
+            messages = self.batch_get_messages(message_ids, format=format)
+            return [messages[message_id] for message_id in message_ids if message_id in messages]
         except HttpError as error:
+            self._invalidate_on_unauthorized(error)
             logger.error(f"Error retrieving messages: {error}")
             raise
     
-    def get_message(self, message_id: str) -> Optional[Dict]:
+    @_requires_auth
+    def list_message_ids(self, max_results: int = 10, query: str = "") -> List[str]:
+        """
+        List message IDs from Gmail without fetching message contents.
+        
+        Args:
+            max_results: Maximum number of message IDs to return
+            query: Gmail search query
+            
+        Returns:
+            List of message IDs, most recent first
+        """
+        message_ids, _ = self._list_page(max_results, query)
+        return message_ids
+    
+    def _list_page(self, page_size: int, query: str = "", page_token: Optional[str] = None) -> Tuple[List[str], Optional[str]]:
+        """
+        List one page of message IDs.
+        
+        Args:
+            page_size: Maximum number of message IDs in the page
+            query: Gmail search query
+            page_token: Token of the page to list; the first page when omitted
+            
+        Returns:
+            Tuple of (message IDs, token of the next page or None)
+        """
+        results = self.service.users().messages().list(
+            userId=self.user_id, 
+            maxResults=page_size,
+            q=query,
+            pageToken=page_token
+        ).execute()
+        
+        return [msg['id'] for msg in results.get('messages', [])], results.get('nextPageToken')
+    
+    @_requires_auth
+    def get_messages_paginated(
+        self,
+        max_pages: int = 5,
+        page_size: int = 100,
+        query: str = "",
+        format: str = 'metadata',
+    ) -> Iterator[Dict]:
+        """
+        Yield messages page by page, listing the next page while the current one is fetched.
+        
+        Args:
+            max_pages: Maximum number of pages to read
+            page_size: Message IDs per page, at most GMAIL_LIST_PAGE_LIMIT
+            query: Gmail search query
+            format: 'metadata' or 'full', as for batch_get_messages
+            
+        Yields:
+            Processed messages, most recent first
+        """
+        message_ids, page_token = self._list_page(page_size, query)
+        for page in range(max_pages):
+            # The next list() call runs on a worker while this page's messages are fetched
+            next_page = None
+            if page_token and page + 1 < max_pages:
+                next_page = self._executor.submit(self._list_page, page_size, query, page_token)
+            
+            messages = self.batch_get_messages(message_ids, format=format)
+            for message_id in message_ids:
+                if message_id in messages:
+                    yield messages[message_id]
+            
+            if next_page is None:
+                return
+            message_ids, page_token = next_page.result()
+    
+    def get_message(
+        self,
+        message_id: str,
+        want: Literal['plain', 'html', 'both'] = 'both',
+        format: str = 'full',
+        metadata_headers: Optional[List[str]] = None,
+    ) -> Optional[Dict]:
         """
         Get a specific message by ID.
         
+        Only full messages with both bodies are added to the message cache.
+        
         Args:
             message_id: The ID of the message to retrieve
+            want: Which bodies to decode (see _extract_content)
+            format: 'full', or 'metadata' for headers, labels and snippet without the bodies
+            metadata_headers: Headers to return with format='metadata'; defaults to METADATA_HEADERS
             
         Returns:
             Message dictionary or None if not found
         """
-        if not self.service:
-            if not self.authenticate():
-                raise Exception("Failed to authenticate with Gmail")
+        with self._message_cache_lock:
+            cached = self._message_cache.get(message_id)
+        if cached is not None:
+            return cached
+        
+        message = self.get_message_raw(message_id, format=format, metadata_headers=metadata_headers)
+        if message is None:
+            return None
+        
+        # Process the message to extract headers, body, etc.
+        processed_message = self._process_message(message, want=want)
+        if format == 'full' and want == 'both':
+            with self._message_cache_lock:
+                self._message_cache[message_id] = processed_message
+        return processed_message
+    
+    @_requires_auth
+    def get_message_raw(
+        self,
+        message_id: str,
+        format: str = 'minimal',
+        metadata_headers: Optional[List[str]] = None,
+    ) -> Optional[Dict]:
+        """
+        Get a message as returned by the Gmail API, without processing or caching it.
+        
+        The default 'minimal' format returns only the ID, thread, labels and
+        snippet, which is all a label or read-state check needs.
         
+        Args:
+            message_id: The ID of the message to retrieve
+            format: 'minimal', 'metadata' or 'full'
+            metadata_headers: Headers to return with format='metadata'; defaults to METADATA_HEADERS
+            
+        Returns:
+            Gmail API message resource, or None if not found
+        """
         try:
-            message = self.service.users().messages().get(
+            if format == 'metadata':
+                request_kwargs = {'metadataHeaders': metadata_headers or METADATA_HEADERS, 'fields': METADATA_FIELDS}
+            else:
+                request_kwargs = {}
+            return self.service.users().messages().get(
                 userId=self.user_id, 
                 id=message_id,
-                format='full'
+                format=format,
+                **request_kwargs
             ).execute()
-            
-            # Process the message to extract headers, body, etc.
-            processed_message = self._process_message(message)
-            return processed_message
         except HttpError as error:
+            self._invalidate_on_unauthorized(error)
             logger.error(f"Error retrieving message {message_id}: {error}")
             return None
     
-    def _process_message(self, message: Dict) -> Dict:
+    @_requires_auth
+    def batch_get_messages(self, message_ids: List[str], format: str = 'full') -> Dict[str, Dict]:
+        """
+        Get several messages by ID using Gmail batch requests.
+        
+        Up to GMAIL_BATCH_LIMIT messages are fetched per HTTP round trip instead
+        of one round trip per message. Messages still in the message cache are
+        not fetched again.
+        
+        With format='metadata' only METADATA_FIELDS are requested, so the
+        response carries no bodies and body_plain/body_html are empty. Such
+        messages are not added to the message cache, which holds full messages.
+        
+        Args:
+            message_ids: IDs of the messages to retrieve
+            format: 'full' or 'metadata'
+            
+        Returns:
+            Dictionary of processed messages keyed by message ID. Messages that
+            could not be retrieved are omitted.
+        """
+        messages = {}
+        # Batch request IDs must be unique
+        missing_ids = []
+        with self._message_cache_lock:
+            for message_id in dict.fromkeys(message_ids):
+                cached = self._message_cache.get(message_id)
+                if cached is not None:
+                    messages[message_id] = cached
+                else:
+                    missing_ids.append(message_id)
+        
+        if not missing_ids:
+            return messages
+        
+        def collect(request_id, response, exception):
+            if exception is not None:
+                if isinstance(exception, HttpError):
+                    self._invalidate_on_unauthorized(exception)
+                logger.error(f"Error retrieving message {request_id}: {exception}")
+                return
+            processed_message = self._process_message(response)
+            messages[request_id] = processed_message
+            if format == 'full':
+                with self._message_cache_lock:
+                    self._message_cache[request_id] = processed_message
+        
+        if format == 'metadata':
+            request_kwargs = {'metadataHeaders': METADATA_HEADERS, 'fields': METADATA_FIELDS}
+        else:
+            request_kwargs = {}
+        
+        def build_request(message_id):
+            return self.service.users().messages().get(
+                userId=self.user_id,
+                id=message_id,
+                format=format,
+                **request_kwargs
+            )
+        
+        for start in range(0, len(missing_ids), GMAIL_BATCH_LIMIT):
+            chunk = missing_ids[start:start + GMAIL_BATCH_LIMIT]
+            batch = self.service.new_batch_http_request(callback=collect)
+            for message_id in chunk:
+                batch.add(build_request(message_id), request_id=message_id)
+            try:
+                batch.execute()
+            except HttpError as error:
+                # The batch endpoint itself failed; fetch what is still missing concurrently instead
+                logger.warning(f"Batch request failed, fetching {len(chunk)} messages individually: {error}")
+                self._fetch_concurrently([message_id for message_id in chunk if message_id not in messages], build_request, collect)
+        
+        return messages
+    
+    def _fetch_concurrently(self, message_ids: List[str], build_request, collect) -> None:
+        """
+        Execute one messages.get per ID on the worker threads, at most GMAIL_WORKER_THREADS at once.
+        
+        Args:
+            message_ids: IDs of the messages to fetch
+            build_request: Builds the messages.get request for an ID
+            collect: Batch-style callback, called with (request_id, response, exception) on this thread
+        """
+        futures = {
+            message_id: self._executor.submit(lambda message_id=message_id: build_request(message_id).execute())
+            for message_id in message_ids
+        }
+        for message_id, future in futures.items():
+            try:
+                response = future.result()
+            except HttpError as error:
+                collect(message_id, None, error)
+            else:
+                collect(message_id, response, None)
+    
+    def get_cached_message(self, message_id: str) -> Optional[Dict]:
+        """
+        Get a message from the message cache without calling Gmail.
+        
+        Args:
+            message_id: The ID of the message to look up
+            
+        Returns:
+            The cached processed message, or None if it is not cached
+        """
+        with self._message_cache_lock:
+            return self._message_cache.get(message_id)
+    
+    def clear_message_cache(self, message_id: Optional[str] = None) -> None:
+        """
+        Drop cached messages so the next read goes to Gmail.
+        
+        Args:
+            message_id: ID of the message to drop; clears the whole cache when omitted
+        """
+        with self._message_cache_lock:
+            if message_id is None:
+                self._message_cache.clear()
+            else:
+                self._message_cache.pop(message_id, None)
+    
+    def _process_message(
+        self,
+        message: Dict,
+        include_raw: bool = False,
+        want: Literal['plain', 'html', 'both'] = 'both',
+    ) -> Dict:
         """
         Process a raw message from Gmail API into a more usable format.
         
+        The raw message holds every MIME part with its base64 data, so it is
+        only kept when asked for; cached messages would otherwise hold each
+        body twice.
+        
         Args:
             message: Raw message from Gmail API
+            include_raw: Keep the raw message under 'raw'
+            want: Which bodies to decode (see _extract_content)
             
         Returns:
             Processed message with headers and body extracted
         """
-        headers = {}
-        for header in message['payload']['headers']:
-            headers[header['name'].lower()] = header['value']
+        headers = {
+            name: header['value']
+            for header in message['payload'].get('headers', [])
+            if (name := header['name'].lower()) in KEPT_HEADERS
+        }
         
         # Extract plain text and HTML content
-        plain_content, html_content = self._extract_content(message['payload'])
+        plain_content, html_content = self._extract_content(message['payload'], want, message.get('snippet', ''))
         
-        return {
+        processed_message = {
             'id': message['id'],
             'thread_id': message['threadId'],
+            'history_id': message.get('historyId'),
             'label_ids': message.get('labelIds', []),
             'snippet': message.get('snippet', ''),
             'headers': headers,
@@ -158,44 +555,92 @@ class GmailClient:
             'date': headers.get('date', ''),
             'body_plain': plain_content,
             'body_html': html_content,
-            'raw': message  # Include raw message for advanced processing if needed
         }
+        if include_raw:
+            processed_message['raw'] = message
+        return processed_message
     
-    def _extract_content(self, payload: Dict) -> Tuple[str, str]:
+    def _extract_content(
+        self,
+        payload: Dict,
+        want: Literal['plain', 'html', 'both'] = 'both',
+        fallback: str = "",
+    ) -> Tuple[str, str]:
         """
         Extract plain text and HTML content from message payload.
         
+        The parts are located first and only the wanted ones are decoded, so a
+        caller that needs only text skips base64-decoding the HTML alternative.
+        
         Args:
             payload: Message payload from Gmail API
+            want: 'both' decodes both bodies; 'plain' decodes the plain part and
+                the HTML part only when there is no plain part; 'html' decodes
+                only the HTML part
+            fallback: Plain text used when every body found is over MAX_DECODE_BYTES
             
         Returns:
-            Tuple of (plain_text, html_content)
+            Tuple of (plain_text, html_content); a body that was not decoded is empty
         """
+        plain_data, html_data = self._find_body_data(payload)
+        skipped = False
+        
         plain_content = ""
-        html_content = ""
-        
-        # Handle multipart messages
-        if 'parts' in payload:
-            for part in payload['parts']:
-                if part['mimeType'] == 'text/plain':
-                    plain_content = self._decode_body(part['body'].get('data', ''))
-                elif part['mimeType'] == 'text/html':
-                    html_content = self._decode_body(part['body'].get('data', ''))
-                # Recursively process nested multipart messages
-                elif 'parts' in part:
-                    nested_plain, nested_html = self._extract_content(part)
-                    if nested_plain and not plain_content:
-                        plain_content = nested_plain
-                    if nested_html and not html_content:
-                        html_content = nested_html
-        # Handle single part messages
-        elif payload.get('mimeType') == 'text/plain':
-            plain_content = self._decode_body(payload['body'].get('data', ''))
-        elif payload.get('mimeType') == 'text/html':
-            html_content = self._decode_body(payload['body'].get('data', ''))
+        if want != 'html':
+            plain_content = self._decode_within_limit(plain_data)
+            if plain_content is None:
+                skipped, plain_content = True, ""
+            elif want == 'plain' and plain_content:
+                return plain_content, ""
+        
+        html_content = self._decode_within_limit(html_data)
+        if html_content is None:
+            skipped, html_content = True, ""
         
+        if skipped and not (plain_content or html_content):
+            plain_content = fallback
         return plain_content, html_content
     
+    def _decode_within_limit(self, data: str) -> Optional[str]:
+        """Decode a body unless it would exceed MAX_DECODE_BYTES, in which case return None."""
+        # Four base64 characters carry three bytes
+        if len(data) // 4 * 3 > MAX_DECODE_BYTES:
+            logger.info(f"Skipping a message body of about {len(data) // 4 * 3} bytes")
+            return None
+        return self._decode_body(data)
+    
+    def _find_body_data(self, payload: Dict) -> Tuple[str, str]:
+        """
+        Find the base64 data of the plain text and HTML bodies without decoding them.
+        
+        The MIME tree is walked depth-first in document order with an explicit
+        stack, and the walk stops as soon as both bodies are found.
+        
+        Args:
+            payload: Message payload from Gmail API
+            
+        Returns:
+            Tuple of (plain_data, html_data) of the first part of each type
+        """
+        plain_data = ""
+        html_data = ""
+        
+        stack = [payload]
+        while stack:
+            part = stack.pop()
+            mime_type = part.get('mimeType')
+            if mime_type == 'text/plain':
+                plain_data = plain_data or part.get('body', {}).get('data', '')
+            elif mime_type == 'text/html':
+                html_data = html_data or part.get('body', {}).get('data', '')
+            elif 'parts' in part:
+                # Reversed, so the first part is popped first
+                stack.extend(reversed(part['parts']))
+            if plain_data and html_data:
+                break
+        
+        return plain_data, html_data
+    
     def _decode_body(self, data: str) -> str:
         """
         Decode base64 encoded message body.
@@ -206,21 +651,32 @@ class GmailClient:
         Returns:
             Decoded string
         """
+        return self._decode_body_bytes(data).decode('utf-8', errors='replace')
+    
+    def _decode_body_bytes(self, data: str) -> bytes:
+        """
+        Decode base64 encoded message body to bytes, for callers that do not need text.
+        
+        Args:
+            data: Base64 encoded string
+            
+        Returns:
+            Decoded bytes; empty if the data is missing or invalid
+        """
         if not data:
-            return ""
+            return b""
         
-        # Add padding if needed
-        padded_data = data.replace('-', '+').replace('_', '/')
-        padding_needed = len(padded_data) % 4
-        if padding_needed:
-            padded_data += '=' * (4 - padding_needed)
+        # Gmail uses the URL-safe alphabet, translated inside binascii; only the padding is added here
+        padded_data = data.encode('ascii')
+        padded_data += b'=' * (-len(padded_data) % 4)
         
         try:
-            return base64.b64decode(padded_data).decode('utf-8')
+            return urlsafe_b64decode(padded_data)
         except Exception as e:
             logger.error(f"Error decoding message body: {e}")
-            return ""
+            return b""
     
+    @_requires_auth
     def send_message(self, to: str, subject: str, body_plain: str, body_html: str = None, 
                      cc: str = None, bcc: str = None, thread_id: str = None) -> Optional[str]:
         """
@@ -238,31 +694,10 @@ class GmailClient:
         Returns:
             Message ID if successful, None otherwise
         """
-        if not self.service:
-            if not self.authenticate():
-                raise Exception("Failed to authenticate with Gmail")
-        
         try:
-            message = MIMEMultipart('alternative')
-            message['To'] = to
-            message['Subject'] = subject
-            
-            if cc:
-                message['Cc'] = cc
-            if bcc:
-                message['Bcc'] = bcc
-            
-            # Add plain text part
-            part1 = MIMEText(body_plain, 'plain')
-            message.attach(part1)
-            
-            # Add HTML part if provided
-            if body_html:
-                part2 = MIMEText(body_html, 'html')
-                message.attach(part2)
-            
             # Encode the message
-            encoded_message = base64.urlsafe_b64encode(message.as_bytes()).decode()
+            raw_message = self._build_raw_message(to, subject, body_plain, body_html, cc, bcc)
+            encoded_message = base64.urlsafe_b64encode(raw_message).decode('ascii')
             
             # Create the message dict
             message_dict = {
@@ -281,10 +716,95 @@ class GmailClient:
             
             return sent_message['id']
         except HttpError as error:
+            self._invalidate_on_unauthorized(error)
             logger.error(f"Error sending message: {error}")
             return None
     
-    def reply_to_message(self, message_id: str, body_plain: str, body_html: str = None) -> Optional[str]:
+    @_requires_auth
+    def send_messages(self, messages: List[Dict[str, Any]]) -> List[Optional[str]]:
+        """
+        Send several email messages concurrently.
+        
+        Each send runs on one of the client's worker threads over that thread's
+        own connection, at most GMAIL_WORKER_THREADS at once.
+        
+        Args:
+            messages: Keyword arguments of send_message, one dictionary per message
+            
+        Returns:
+            Sent message ID per message, in order; None for messages that failed
+        """
+        return list(self._executor.map(lambda message: self.send_message(**message), messages))
+    
+    @staticmethod
+    def _encode_addresses(value: str) -> str:
+        """
+        Format an address header, RFC 2047 encoding only the non-ASCII display names.
+        
+        Returns:
+            The comma-separated addresses
+        """
+        addresses = []
+        for display_name, address in getaddresses([value]):
+            if display_name.isascii():
+                addresses.append(formataddr((display_name, address)))
+            else:
+                encoded_name = Header(display_name, 'utf-8').encode(linesep='\r\n')
+                addresses.append(f'{encoded_name} <{address}>')
+        return ', '.join(addresses)
+    
+    @staticmethod
+    def _build_raw_message(to: str, subject: str, body_plain: str, body_html: Optional[str] = None,
+                           cc: Optional[str] = None, bcc: Optional[str] = None) -> bytes:
+        """
+        Assemble a multipart/alternative RFC 822 message without the email.generator machinery.
+        
+        Both parts are UTF-8 and base64-encoded, so no charset detection or
+        quoted-printable pass is needed. Non-ASCII subjects and display names
+        are RFC 2047 encoded; addresses are left as they are.
+        
+        Returns:
+            The message bytes, ready for base64url encoding
+        """
+        boundary = uuid4().hex
+        lines = []
+        for name, value in (('To', to), ('Cc', cc), ('Bcc', bcc), ('Subject', subject)):
+            if value:
+                # Line breaks in a value would start a new header
+                value = ' '.join(value.splitlines())
+                if name == 'Subject':
+                    if not value.isascii():
+                        value = Header(value, 'utf-8').encode(linesep='\r\n')
+                else:
+                    value = GmailClient._encode_addresses(value)
+                lines.append(f'{name}: {value}')
+        lines += [
+            'MIME-Version: 1.0',
+            f'Content-Type: multipart/alternative; boundary="{boundary}"',
+            '',
+        ]
+        
+        message = bytearray('\r\n'.join(lines).encode('ascii'))
+        for subtype, body in (('plain', body_plain), ('html', body_html)):
+            if subtype == 'html' and not body:
+                continue
+            message += (
+                f'\r\n--{boundary}\r\n'
+                f'Content-Type: text/{subtype}; charset="utf-8"\r\n'
+                'Content-Transfer-Encoding: base64\r\n\r\n'
+            ).encode('ascii')
+            message += base64.encodebytes((body or '').encode('utf-8')).replace(b'\n', b'\r\n')
+        message += f'\r\n--{boundary}--\r\n'.encode('ascii')
+        return bytes(message)
+    
+    @_requires_auth
+    def reply_to_message(
+        self,
+        message_id: str,
+        body_plain: str,
+        body_html: str = None,
+        original_message: Optional[Dict] = None,
+    ) -> Optional[str]:
         """
         Reply to a specific message.
         
@@ -292,23 +812,23 @@ class GmailClient:
             message_id: ID of the message to reply to
             body_plain: Plain text body
             body_html: HTML body (optional)
+            original_message: The message being replied to, with 'thread_id', 'from' and
+                'subject' keys, when the caller already has it; skips fetching it from Gmail
             
         Returns:
             Message ID if successful, None otherwise
         """
-        if not self.service:
-            if not self.authenticate():
-                raise Exception("Failed to authenticate with Gmail")
-        
         try:
-            # Get the original message to extract headers
-            original = self.get_message(message_id)
+            # Get the original message's headers; its bodies are not needed
+            original = original_message or self.get_message(
+                message_id, format='metadata', metadata_headers=['From', 'Subject']
+            )
             if not original:
                 return None
             
             # Extract necessary information
-            to_address = original['headers'].get('from', '')
-            subject = original['headers'].get('subject', '')
+            to_address = original.get('from') or ''
+            subject = original.get('subject') or ''
             if not subject.startswith('Re:'):
                 subject = f"Re: {subject}"
             
@@ -321,9 +841,11 @@ class GmailClient:
                 thread_id=original['thread_id']
             )
         except HttpError as error:
+            self._invalidate_on_unauthorized(error)
             logger.error(f"Error replying to message {message_id}: {error}")
             return None
     
+    @_requires_auth
     def get_labels(self) -> List[Dict]:
         """
         Get all labels from Gmail.
@@ -331,17 +853,47 @@ class GmailClient:
         Returns:
             List of label dictionaries
         """
-        if not self.service:
-            if not self.authenticate():
-                raise Exception("Failed to authenticate with Gmail")
+        with self._label_cache_lock:
+            labels = self._label_cache.get(self.user_id)
+        if labels is not None:
+            return labels
         
         try:
             results = self.service.users().labels().list(userId=self.user_id).execute()
-            return results.get('labels', [])
+            labels = results.get('labels', [])
+            with self._label_cache_lock:
+                self._label_cache[self.user_id] = labels
+                # Name index built once per fetch, for get_label_by_name
+                self._label_cache[self.user_id, 'by_name'] = {label['name']: label for label in labels}
+            return labels
         except HttpError as error:
+            self._invalidate_on_unauthorized(error)
             logger.error(f"Error retrieving labels: {error}")
             return []
     
+    def get_label_by_name(self, name: str) -> Optional[Dict]:
+        """
+        Look up a label by its name in the cached label list.
+        
+        Args:
+            name: Name of the label, as shown in Gmail
+            
+        Returns:
+            Label dictionary, or None if there is no such label
+        """
+        with self._label_cache_lock:
+            by_name = self._label_cache.get((self.user_id, 'by_name'))
+        if by_name is None:
+            self.get_labels()
+            with self._label_cache_lock:
+                by_name = self._label_cache.get((self.user_id, 'by_name'), {})
+        return by_name.get(name)
+    
+    def clear_label_cache(self) -> None:
+        """Drop the cached label list so the next read goes to Gmail."""
+        with self._label_cache_lock:
+            self._label_cache.clear()
+    
     def add_label_to_message(self, message_id: str, label_id: str) -> bool:
         """
         Add a label to a message.
@@ -353,20 +905,7 @@ class GmailClient:
         Returns:
             True if successful, False otherwise
         """
-        if not self.service:
-            if not self.authenticate():
-                raise Exception("Failed to authenticate with Gmail")
-        
-        try:
-            self.service.users().messages().modify(
-                userId=self.user_id,
-                id=message_id,
-                body={'addLabelIds': [label_id]}
-            ).execute()
-            return True
-        except HttpError as error:
-            logger.error(f"Error adding label {label_id} to message {message_id}: {error}")
-            return False
+        return self.add_label_to_messages([message_id], label_id)
     
     def remove_label_from_message(self, message_id: str, label_id: str) -> bool:
         """
@@ -379,17 +918,71 @@ class GmailClient:
         Returns:
             True if successful, False otherwise
         """
-        if not self.service:
-            if not self.authenticate():
-                raise Exception("Failed to authenticate with Gmail")
+        return self.remove_label_from_messages([message_id], label_id)
+    
+    def add_label_to_messages(self, message_ids: List[str], label_id: str) -> bool:
+        """
+        Add a label to several messages with batchModify.
         
+        Args:
+            message_ids: IDs of the messages
+            label_id: ID of the label to add
+            
+        Returns:
+            True if successful, False otherwise
+        """
+        return self.batch_modify(message_ids, add_label_ids=[label_id])
+    
+    def remove_label_from_messages(self, message_ids: List[str], label_id: str) -> bool:
+        """
+        Remove a label from several messages with batchModify.
+        
+        Args:
+            message_ids: IDs of the messages
+            label_id: ID of the label to remove
+            
+        Returns:
+            True if successful, False otherwise
+        """
+        return self.batch_modify(message_ids, remove_label_ids=[label_id])
+    
+    @_requires_auth
+    def batch_modify(self, message_ids: List[str], add_label_ids: Optional[List[str]] = None,
+                     remove_label_ids: Optional[List[str]] = None) -> bool:
+        """
+        Add and remove labels on several messages at once.
+        
+        Uses Gmail's messages.batchModify, so up to GMAIL_BATCH_MODIFY_LIMIT
+        messages are changed per HTTP round trip.
+        
+        Args:
+            message_ids: IDs of the messages to modify
+            add_label_ids: IDs of the labels to add (optional)
+            remove_label_ids: IDs of the labels to remove (optional)
+            
+        Returns:
+            True if successful, False otherwise
+        """
+        unique_ids = list(dict.fromkeys(message_ids))
         try:
-            self.service.users().messages().modify(
-                userId=self.user_id,
-                id=message_id,
-                body={'removeLabelIds': [label_id]}
-            ).execute()
+            for start in range(0, len(unique_ids), GMAIL_BATCH_MODIFY_LIMIT):
+                chunk = unique_ids[start:start + GMAIL_BATCH_MODIFY_LIMIT]
+                self.service.users().messages().batchModify(
+                    userId=self.user_id,
+                    body={
+                        'ids': chunk,
+                        'addLabelIds': add_label_ids or [],
+                        'removeLabelIds': remove_label_ids or []
+                    }
+                ).execute()
+                # The cached copies still have the old label IDs
+                for message_id in chunk:
+                    self.clear_message_cache(message_id)
             return True
         except HttpError as error:
-            logger.error(f"Error removing label {label_id} from message {message_id}: {error}")
+            self._invalidate_on_unauthorized(error)
+            if error.resp.status in (400, 404):
+                # Possibly a label deleted since the label list was cached
+                self.clear_label_cache()
+            logger.error(f"Error modifying labels on {len(unique_ids)} messages: {error}")
             return False